@@ -18,8 +18,10 @@ def get_tab_name():
 if "bpy" in locals():
 	import imp
 	imp.reload(settings)
+	imp.reload(utilities_buffer)
 	imp.reload(utilities_bake)
 	imp.reload(utilities_color)
+	imp.reload(utilities_pack)
 	imp.reload(utilities_texel)
 	imp.reload(utilities_ui)
 	imp.reload(utilities_uv)
@@ -27,6 +29,7 @@ if "bpy" in locals():
 	
 	imp.reload(op_align)
 	imp.reload(op_bake)
+	imp.reload(op_bake_farm)
 	imp.reload(op_bake_explode)
 	imp.reload(op_bake_organize_names)
 	imp.reload(op_color_assign)
@@ -40,6 +43,7 @@ if "bpy" in locals():
 	imp.reload(op_island_align_sort)
 	imp.reload(op_island_mirror)
 	imp.reload(op_island_rotate_90)
+	imp.reload(op_island_stack_identical)
 	imp.reload(op_island_straighten_edge_loops)
 	imp.reload(op_rectify)
 	imp.reload(op_select_islands_identical)
@@ -48,7 +52,9 @@ if "bpy" in locals():
 	imp.reload(op_smoothing_uv_islands)
 	imp.reload(op_swap_uv_xyz)
 	imp.reload(op_texel_checker_map)
+	imp.reload(op_texel_coverage)
 	imp.reload(op_texel_density_get)
+	imp.reload(op_texel_density_report)
 	imp.reload(op_texel_density_set)
 	imp.reload(op_texture_reload_all)
 	imp.reload(op_unwrap_faces_iron)
@@ -62,14 +68,17 @@ if "bpy" in locals():
 	
 else:
 	from . import settings
+	from . import utilities_buffer
 	from . import utilities_bake
 	from . import utilities_color
+	from . import utilities_pack
 	from . import utilities_texel
 	from . import utilities_ui
 	from . import utilities_uv
 
 	from . import op_align
 	from . import op_bake
+	from . import op_bake_farm
 	from . import op_bake_explode
 	from . import op_bake_organize_names
 	from . import op_color_assign
@@ -83,6 +92,7 @@ else:
 	from . import op_island_align_sort
 	from . import op_island_mirror
 	from . import op_island_rotate_90
+	from . import op_island_stack_identical
 	from . import op_island_straighten_edge_loops
 	from . import op_rectify
 	from . import op_select_islands_identical
@@ -91,7 +101,9 @@ else:
 	from . import op_smoothing_uv_islands
 	from . import op_swap_uv_xyz
 	from . import op_texel_checker_map
+	from . import op_texel_coverage
 	from . import op_texel_density_get
+	from . import op_texel_density_report
 	from . import op_texel_density_set
 	from . import op_texture_reload_all
 	from . import op_unwrap_faces_iron
@@ -350,6 +362,23 @@ class TexToolsSettings(bpy.types.PropertyGroup):
 		('2', '2x', 'Render 2x and downsample'), 
 		('4', '4x', 'Render 2x and downsample')], name = "AA", default = '1'
 	)
+	bake_modes = bpy.props.EnumProperty(items= 
+		[(mode, mode.replace('_',' ').title(), "Also bake '{}' in the same job".format(mode)) for mode in sorted(op_bake.modes.keys())],
+		name = "Modes",
+		description = "Additional modes baked together with the selected mode, sharing the material and vertex color setup of each set",
+		options = {'ENUM_FLAG'},
+		default = set()
+	)
+	bake_incremental = bpy.props.BoolProperty(
+		name="Skip Unchanged",
+		description="Skip sets whose meshes, modifiers, materials, transforms and bake settings did not change since their texture was baked",
+		default = False
+	)
+	bake_resume = bpy.props.BoolProperty(
+		name="Resume",
+		description="Skip sets already saved by a previous cancelled or failed bake with the same settings, as long as their meshes, materials and transforms did not change",
+		default = False
+	)
 	bake_freeze_selection = bpy.props.BoolProperty(
 		name="Lock",
 		description="Lock baking sets, don't change with selection",
@@ -575,6 +604,12 @@ class Panel_Layout(bpy.types.Panel):
 		op.is_vertical = True;
 		op.padding = utilities_ui.get_padding()
 
+		op = aligned.operator(op_island_align_sort.op.bl_idname, text="Pack")
+		op.is_pack = True;
+		op.padding = utilities_ui.get_padding()
+
+		box.operator(op_island_stack_identical.op.bl_idname, text="Stack Identical")
+
 		aligned = box.row(align=True)
 		col = aligned.column(align=True)
 		# row = col.row(align=True)
@@ -622,6 +657,7 @@ class Panel_Layout(bpy.types.Panel):
 		# col = box.column(align=True)
 
 		box.operator(op_texel_checker_map.op.bl_idname, text ="Checker Map", icon_value = icon_get("op_texel_checker_map"))
+		box.operator(op_texel_coverage.op.bl_idname, text ="Coverage")
 		
 
 		col = box.column(align=True)
@@ -634,6 +670,7 @@ class Panel_Layout(bpy.types.Panel):
 
 		col = box.column(align=True)
 		col.operator(op_texel_density_set.op.bl_idname, text="Apply", icon = 'FACESEL_HLT')
+		col.operator(op_texel_density_report.op.bl_idname, text="Report")
 		row = col.row(align=True)
 		if bpy.context.object.mode == 'EDIT':
 			row.enabled  = False
@@ -673,7 +710,7 @@ class Panel_Bake(bpy.types.Panel):
 
 		if not (bpy.context.scene.texToolsSettings.bake_freeze_selection and len(settings.sets) > 0):
 			# Update sets
-			settings.sets = utilities_bake.get_bake_sets()
+			settings.sets = utilities_bake.get_bake_sets_cached()
 
 
 		# Bake Button
@@ -682,7 +719,17 @@ class Panel_Bake(bpy.types.Panel):
 			count = 1
 		else:
 			count = len(settings.sets)
-		col.operator(op_bake.op.bl_idname, text = "Bake {}x".format(count), icon_value = icon_get("op_bake"));
+		row = col.row(align=True)
+		count_modes = len(op_bake.get_bake_modes())
+		if count_modes > 1:
+			row.operator(op_bake.op.bl_idname, text = "Bake {}x {} modes".format(count, count_modes), icon_value = icon_get("op_bake"));
+		else:
+			row.operator(op_bake.op.bl_idname, text = "Bake {}x".format(count), icon_value = icon_get("op_bake"));
+		row.operator(op_bake_farm.op.bl_idname, text = "", icon = 'RENDER_ANIMATION')
+		if settings.bake_job:
+			row = col.row()
+			row.alert = True
+			row.label(text="{:.0f}% {}".format(settings.bake_job.get_progress() * 100, settings.bake_job.get_status()), icon='TIME')
 		col.prop(context.scene.texToolsSettings, "bake_sampling", icon_value =icon_get("bake_anti_alias"))
 		
 		# Force Single
@@ -694,6 +741,11 @@ class Panel_Bake(bpy.types.Panel):
 		else:
 			row.label(text="")
 
+		row = col.row(align=True)
+		row.active = len(settings.sets) > 0 and not bpy.context.scene.texToolsSettings.bake_force_single
+		row.prop(context.scene.texToolsSettings, "bake_incremental")
+		row.prop(context.scene.texToolsSettings, "bake_resume")
+
 
 		if bpy.app.debug_value != 0:
 			row = col.row()
@@ -714,6 +766,11 @@ class Panel_Bake(bpy.types.Panel):
 			row = col.row()
 			row.label(text="--> Mode: '{}'".format(settings.bake_mode))
 
+		# Additional Modes
+		col.label(text="Also bake:")
+		flow = col.column_flow(columns=2, align=True)
+		flow.prop(context.scene.texToolsSettings, "bake_modes", expand=True)
+
 
 
 
@@ -724,7 +781,7 @@ class Panel_Bake(bpy.types.Panel):
 				col.prop(context.scene.texToolsSettings, "bake_ray_distance")
 				break		
 
-		if settings.bake_mode == 'ao':
+		if 'ao' in op_bake.get_bake_modes():
 			col.prop(context.scene.texToolsSettings, "bake_samples")
 		
 		
@@ -43,6 +43,7 @@ class op(bpy.types.Operator):
 	def execute(self, context):
 		
 		align(context, self.direction)
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
@@ -51,7 +52,7 @@ class op(bpy.types.Operator):
 
 def align(context, direction):
 	#Store selection
-	utilities_uv.selection_store()
+	snapshot = utilities_uv.selection_store()
 
 	if bpy.context.space_data.pivot_point != 'CENTER':
 		bpy.context.space_data.pivot_point = 'CENTER'
@@ -79,7 +80,7 @@ def align(context, direction):
 			
 			bpy.ops.uv.select_all(action='DESELECT')
 			utilities_uv.setSelectedFaces(island)
-			bounds = utilities_uv.getSelectionBBox()
+			bounds = utilities_uv.get_bbox_faces(uvLayer, island)
 
 			# print("Island "+str(len(island))+"x faces, delta: "+str(delta.y))
 
@@ -121,7 +122,7 @@ def align(context, direction):
 		bmesh.update_edit_mesh(obj.data)
 
 	#Restore selection
-	utilities_uv.selection_restore()
+	utilities_uv.selection_restore(snapshot)
 
 
 
@@ -1,5 +1,7 @@
 import bpy
 import os
+import json
+import time
 import bmesh
 from mathutils import Vector
 from collections import defaultdict
@@ -24,182 +26,457 @@ modes={
 	'ao':				utilities_bake.BakeMode('',					type='AO')
 }
 
+# Materials assigned by the bake, swapped between modes
+materials = ["TT_bake_node"] + [mode.material for mode in modes.values() if mode.material != ""]
+
+# Order in which the modes of a job are baked: single sample EMIT and DIFFUSE first,
+# the sampled AO last
+order_types = ['EMIT', 'DIFFUSE', 'NORMAL', 'AO']
+
 
 class op(bpy.types.Operator):
 	bl_idname = "uv.textools_bake"
 	bl_label = "Bake"
-	bl_description = "Bake selected objects"
+	bl_description = "Bake selected objects in the selected mode and the additional modes, one set at a time. Press ESC to cancel after the current set"
+
+	_timer = None
 
 	@classmethod
 	def poll(cls, context):
 		if len(settings.sets) == 0:
 			return False
+		if settings.bake_job:
+			return False
 		return True
 
 	def execute(self, context):
+		# Blocking: bake all sets in one go
+		if not self.start(context):
+			return {'CANCELLED'}
+		try:
+			while settings.bake_job.step(self):
+				pass
+		finally:
+			self.finish(context)
+		return {'FINISHED'}
 
-
-		if settings.bake_mode not in modes:
-			self.report({'ERROR_INVALID_INPUT'}, "Uknown mode '{}' only available: '{}'".format(settings.bake_mode, ", ".join(modes.keys() )) )
-			return
+	def invoke(self, context, event):
+		# Interactive: bake one set per timer event, the UI redraws in between
+		if not self.start(context):
+			return {'CANCELLED'}
+		self._timer = context.window_manager.event_timer_add(0.1, context.window)
+		context.window_manager.modal_handler_add(self)
+		return {'RUNNING_MODAL'}
+
+	def modal(self, context, event):
+		job = settings.bake_job
+		if event.type == 'ESC':
+			self.report({'WARNING'}, "Bake cancelled after {}/{} sets".format(job.index, len(job.sets)))
+			self.finish(context)
+			return {'CANCELLED'}
+
+		if event.type == 'TIMER':
+			try:
+				is_running = job.step(self)
+			except:
+				self.finish(context)
+				raise
+			if not is_running:
+				self.finish(context)
+				return {'FINISHED'}
+			for area in context.screen.areas:
+				area.tag_redraw()
+
+		return {'RUNNING_MODAL'}
+
+
+	def start(self, context):
+		for mode in get_bake_modes():
+			if mode not in modes:
+				self.report({'ERROR_INVALID_INPUT'}, "Uknown mode '{}' only available: '{}'".format(mode, ", ".join(modes.keys() )) )
+				return False
 
 		# Store Selection
-		selected_objects 	= [obj for obj in bpy.context.selected_objects]
-		active_object 		= bpy.context.scene.objects.active
+		self.selected_objects 	= [obj for obj in bpy.context.selected_objects]
+		self.active_object 		= bpy.context.scene.objects.active
 		utilities_bake.store_bake_settings()
 
-		# Render sets
-		render(
-			self = self, 
-			mode = settings.bake_mode,
+		try:
+			settings.bake_job = BakeJob(
+				modes = get_bake_modes(),
+				sets = list(settings.sets),
 
-			size = bpy.context.scene.texToolsSettings.size, 
+				size = bpy.context.scene.texToolsSettings.size, 
+
+				bake_single = bpy.context.scene.texToolsSettings.bake_force_single,
+				sampling_scale = int(bpy.context.scene.texToolsSettings.bake_sampling),
+				samples = bpy.context.scene.texToolsSettings.bake_samples,
+				ray_distance = bpy.context.scene.texToolsSettings.bake_ray_distance,
+				padding = bpy.context.scene.texToolsSettings.padding,
+				is_resume = bpy.context.scene.texToolsSettings.bake_resume,
+				is_incremental = bpy.context.scene.texToolsSettings.bake_incremental
+			)
+		except:
+			self.finish(context)
+			raise
+		context.window_manager.progress_begin(0, len(settings.bake_job.sets))
+		return True
+
+
+	def finish(self, context):
+		if self._timer:
+			context.window_manager.event_timer_remove(self._timer)
+			self._timer = None
+		context.window_manager.progress_end()
+
+		job = settings.bake_job
+		settings.bake_job = None
+		if job:
+			job.finish()
+			if len(job.failed) > 0:
+				self.report({'WARNING'}, "Baked {}/{} sets, failed: {}".format(len(job.done), len(job.sets), ", ".join(job.failed)))
+			elif job.count_skipped + job.count_unchanged > 0:
+				self.report({'INFO'}, "Baked {} sets, {} resumed from disk, {} unchanged".format(job.count_baked, job.count_skipped, job.count_unchanged))
 
-			bake_single = bpy.context.scene.texToolsSettings.bake_force_single,
-			sampling_scale = int(bpy.context.scene.texToolsSettings.bake_sampling),
-			samples = bpy.context.scene.texToolsSettings.bake_samples,
-			ray_distance = bpy.context.scene.texToolsSettings.bake_ray_distance
-		)
-		
 		# Restore selection
 		utilities_bake.restore_bake_settings()
 		bpy.ops.object.select_all(action='DESELECT')
-		for obj in selected_objects:
+		for obj in self.selected_objects:
 			obj.select = True
-		if active_object:
-			bpy.context.scene.objects.active = active_object
+		if self.active_object:
+			bpy.context.scene.objects.active = self.active_object
+
+		for area in context.screen.areas:
+			area.tag_redraw()
+
+
+
+# Queue of bake sets, baked one set per step(). Each finished texture is saved next
+# to the .blend right away and the names and content hashes of the finished sets
+# are kept in a json job file, so a crashed or cancelled bake can resume with the
+# remaining sets. Resumed sets are only skipped while their hash still matches.
+# Incremental jobs also skip sets whose content hash matches the hash saved
+# with their texture. All modes of a set are baked in one step to share the
+# material and vertex color setup.
+class BakeJob:
+	def __init__(self, modes, sets, size, bake_single, sampling_scale, samples, ray_distance, padding, is_resume, is_incremental=False):
+		self.modes = get_modes_ordered(modes)
+		self.sets = sets
+		self.size = (size[0], size[1])
+		self.bake_single = bake_single
+		self.sampling_scale = sampling_scale
+		self.samples = samples
+		self.ray_distance = ray_distance
+		self.padding = padding
+		self.is_incremental = is_incremental
+
+		self.index = 0
+		self.done = []
+		self.hashes = {}
+		self.resumed = {}
+		self.failed = []
+		self.count_skipped = 0
+		self.count_unchanged = 0
+		self.time_start = time.time()
+		self.time_baking = 0
+		self.count_baked = 0
+		self.current = ""
+
+		# Vertex color generator last applied to each object
+		self.vertex_colors = {}
+
+		# Parameters a resumed job has to match
+		self.key = {
+			'modes':self.modes, 'size':list(self.size), 'single':bake_single, 'sampling':sampling_scale,
+			'samples':samples, 'ray_distance':ray_distance, 'padding':padding
+		}
+
+		# Without a saved .blend there is no place for the textures or the job file
+		self.path_job = None
+		if bpy.data.is_saved:
+			self.path_job = bpy.path.abspath("//textools_bake_{}.json".format("_".join(self.modes)))
+
+		# Textures can only be resumed per set, a single texture is always baked at once
+		if is_resume and not bake_single and self.path_job and os.path.isfile(self.path_job):
+			try:
+				with open(self.path_job) as file:
+					state = json.load(file)
+			except (IOError, ValueError):
+				state = {}
+			if state.get('key') == self.key:
+				for name, hash in state.get('hashes', {}).items():
+					if all(os.path.isfile(get_texture_path(name, mode)) for mode in self.modes):
+						self.resumed[name] = hash
+
+		print("Bake {}x '{}'".format(len(sets), "', '".join(self.modes)))
+
+		# Setup
+		if bpy.context.scene.render.engine != 'CYCLES':
+			bpy.context.scene.render.engine = 'CYCLES'
+		bpy.context.scene.cycles.samples = samples
+
+		# Disable edit mode
+		if bpy.context.scene.objects.active != None and bpy.context.object.mode != 'OBJECT':
+			bpy.ops.object.mode_set(mode='OBJECT')
+
+
+	# Bake the next set, returns False when all sets are processed
+	def step(self, operator):
+		if self.index >= len(self.sets):
+			return False
 
-		return {'FINISHED'}
+		s = self.index
+		set = self.sets[s]
+		self.current = set.name
+		self.index += 1
+
+		modes_changed = []
+		is_resumed = set.name in self.resumed and self.resumed[set.name] == self.get_set_hash(set)
+		if not is_resumed:
+			modes_changed = [mode for mode in self.modes if not self.is_unchanged(set, mode)]
+
+		if is_resumed:
+			print("Bake '{}' skipped, already on disk".format(set.name))
+			self.done.append(set.name)
+			self.hashes[set.name] = self.resumed[set.name]
+			self.count_skipped += 1
+		elif len(modes_changed) == 0:
+			print("Bake '{}' skipped, unchanged".format(set.name))
+			self.done.append(set.name)
+			self.count_unchanged += 1
+		else:
+			time_set = time.time()
+			try:
+				error = render_set(set, s, self.sets, modes_changed, self.size, self.bake_single, self.sampling_scale, self.samples, self.ray_distance, self.padding, self.path_job is not None, self.vertex_colors)
+			except Exception as exception:
+				# Failed bakes (no image, cage mismatch, ...) or failed saves
+				error = "Bake '{}' failed: {}".format(set.name, exception)
+			if error:
+				operator.report({'ERROR_INVALID_INPUT'}, error)
+				self.failed.append(set.name)
+			else:
+				self.done.append(set.name)
+				self.hashes[set.name] = self.get_set_hash(set)
+				self.save()
+				for mode in modes_changed:
+					self.save_hash(set, mode)
+			self.time_baking += time.time() - time_set
+			self.count_baked += 1
+
+		bpy.context.window_manager.progress_update(self.index)
+		print("Bake {}/{} {}".format(self.index, len(self.sets), self.get_status()))
+		return self.index < len(self.sets)
+
+
+	def save(self):
+		if self.path_job and not self.bake_single:
+			with open(self.path_job, 'w') as file:
+				json.dump({'key':self.key, 'hashes':self.hashes}, file)
+
+
+	# Hash of all modes of a set, a resumed set is skipped only while it matches
+	def get_set_hash(self, set):
+		return utilities_bake.get_bake_set_hash(set, self.key, materials)
+
+
+	# Per set hashes are stored next to the texture, not available for single textures
+	def get_hash_path(self, set, mode):
+		if self.path_job is None or self.bake_single:
+			return None
+		return get_texture_path(set.name, mode)+".md5"
+
+
+	# Hash of a single mode, independent of the other modes of the job
+	def get_hash(self, set, mode):
+		parameters = dict(self.key)
+		del parameters['modes']
+		parameters['mode'] = mode
+		return utilities_bake.get_bake_set_hash(set, parameters, materials)
+
+
+	def is_unchanged(self, set, mode):
+		path = self.get_hash_path(set, mode)
+		if not self.is_incremental or path is None or not os.path.isfile(path) or not os.path.isfile(get_texture_path(set.name, mode)):
+			return False
+		with open(path) as file:
+			return file.read().strip() == self.get_hash(set, mode)
 
 
+	# Hashed after baking, the bake itself assigns missing materials
+	def save_hash(self, set, mode):
+		path = self.get_hash_path(set, mode)
+		if path:
+			with open(path, 'w') as file:
+				file.write(self.get_hash(set, mode))
 
-def render(self, mode, size, bake_single, sampling_scale, samples, ray_distance):
 
-	print("Bake '{}'".format(mode))
+	# Remove the job file once every set is baked
+	def finish(self):
+		is_complete = self.index >= len(self.sets) and len(self.failed) == 0
+		if is_complete and self.path_job and os.path.isfile(self.path_job):
+			os.remove(self.path_job)
 
-	# Setup
-	if bpy.context.scene.render.engine != 'CYCLES':
-		bpy.context.scene.render.engine = 'CYCLES'
-	bpy.context.scene.cycles.samples = samples
 
-	# Disable edit mode
-	if bpy.context.scene.objects.active != None and bpy.context.object.mode != 'OBJECT':
-	 	bpy.ops.object.mode_set(mode='OBJECT')
+	def get_progress(self):
+		return self.index / max(len(self.sets), 1)
+
+
+	# Remaining seconds, estimated from the sets baked so far
+	def get_eta(self):
+		if self.count_baked == 0:
+			return None
+		remaining = [set for set in self.sets[self.index:] if set.name not in self.resumed]
+		return self.time_baking / self.count_baked * len(remaining)
+
+
+	def get_status(self):
+		eta = self.get_eta()
+		if eta is None:
+			return "'{}'".format(self.current)
+		return "'{}', {}:{:02d} left".format(self.current, int(eta) // 60, int(eta) % 60)
+
+
+
+def get_texture_path(name, mode):
+	return bpy.path.abspath("//{}_{}.tga".format(name, mode))
+
+
+
+# The mode picked in the panel followed by the additional modes
+def get_bake_modes():
+	return [settings.bake_mode] + [mode for mode in sorted(bpy.context.scene.texToolsSettings.bake_modes) if mode != settings.bake_mode]
+
 
-	# Get the baking sets / pairs
-	sets = settings.sets
 
-	# print("________________________________\nBake {}x '{}' at {} x {}".format(len(sets), mode, width, height))
+# Modes sorted by bake type, modes sharing a vertex color generator next to each other
+def get_modes_ordered(names):
+	names = [name for i, name in enumerate(names) if name not in names[:i]]
+	def key(name):
+		mode = modes[name]
+		generator = mode.setVertexColor.__name__ if mode.setVertexColor else ""
+		return (order_types.index(mode.type), generator, names.index(name))
+	return sorted(names, key=key)
 
+
+
+# Bake all modes of a single set, returns an error message or None
+def render_set(set, s, sets, modes_set, size, bake_single, sampling_scale, samples, ray_distance, padding, is_save, vertex_colors):
+	# Requires 1+ low poly objects
+	if len(set.objects_low) == 0:
+		return "No low poly object as part of the '{}' set".format(set.name)
+
+	# Check for UV maps
+	for obj in set.objects_low:
+		if len(obj.data.uv_layers) == 0:
+			return "No UV map available for '{}'".format(obj.name)
+
+	# Check for cage inconsistencies
+	if len(set.objects_cage) > 0 and (len(set.objects_low) != len(set.objects_cage)):
+		return "{}x cage objects do not match {}x low poly objects for '{}'".format(len(set.objects_cage), len(set.objects_low), set.name)
+
+	material_empty = None
+	if "TT_bake_node" in bpy.data.materials:
+		material_empty = bpy.data.materials["TT_bake_node"]
+	else:
+		material_empty = bpy.data.materials.new(name="TT_bake_node")
+
+	for mode in modes_set:
+		render_set_mode(set, s, sets, mode, size, bake_single, sampling_scale, samples, ray_distance, padding, is_save, vertex_colors, material_empty)
+
+	return None
+
+
+
+def render_set_mode(set, s, sets, mode, size, bake_single, sampling_scale, samples, ray_distance, padding, is_save, vertex_colors, material_empty):
 	render_width = sampling_scale * size[0]
 	render_height = sampling_scale * size[1]
 
-	for s in range(0,len(sets)):
-		set = sets[s]
-
-		# Get image name
-		name_texture = "{}_{}".format(set.name, mode)
-		if bake_single:
-			name_texture = "{}_{}".format(sets[0].name, mode)# In Single mode bake into same texture
-		path = bpy.path.abspath("//{}.tga".format(name_texture))
+	# Get image name
+	name_texture = "{}_{}".format(set.name, mode)
+	path = get_texture_path(set.name, mode)
+	if bake_single:
+		# In Single mode bake into same texture
+		name_texture = "{}_{}".format(sets[0].name, mode)
+		path = get_texture_path(sets[0].name, mode)
 
-		# Requires 1+ low poly objects
-		if len(set.objects_low) == 0:
-			self.report({'ERROR_INVALID_INPUT'}, "No low poly object as part of the '{}' set".format(set.name) )
-			return
+	# Get Materials
+	material_loaded = get_material(mode)
 
-		# Check for UV maps
+	# Assign Materials to Objects
+	if (len(set.objects_high) + len(set.objects_float)) == 0:
+		# Low poly bake: Assign material to lowpoly
 		for obj in set.objects_low:
-			if len(obj.data.uv_layers) == 0:
-				self.report({'ERROR_INVALID_INPUT'}, "No UV map available for '{}'".format(obj.name))
-				return
-
-		# Check for cage inconsistencies
-		if len(set.objects_cage) > 0 and (len(set.objects_low) != len(set.objects_cage)):
-			self.report({'ERROR_INVALID_INPUT'}, "{}x cage objects do not match {}x low poly objects for '{}'".format(len(set.objects_cage), len(set.objects_low), obj.name))
-			return
+			assign_vertex_color(mode, obj, vertex_colors)
+			assign_material(obj, [material_loaded, material_empty])
+	else:
+		# High to low poly: Low poly require empty material to bake into image
+		for obj in set.objects_low:
+			assign_material(obj, [material_empty])
 
-		# Get Materials
-		material_loaded = get_material(mode)
-		material_empty = None
-		if "TT_bake_node" in bpy.data.materials:
-			material_empty = bpy.data.materials["TT_bake_node"]
-		else:
-			material_empty = bpy.data.materials.new(name="TT_bake_node")
-
-		# Assign Materials to Objects
-		if (len(set.objects_high) + len(set.objects_float)) == 0:
-			# Low poly bake: Assign material to lowpoly
-			for obj in set.objects_low:
-				assign_vertex_color(mode, obj)
-				assign_material(obj, [material_loaded, material_empty])
-		else:
-			# High to low poly: Low poly require empty material to bake into image
-			for obj in set.objects_low:
-				assign_material(obj, [material_empty])
+		# Assign material to highpoly
+		for obj in (set.objects_high+set.objects_float):
+			assign_vertex_color(mode, obj, vertex_colors)
+			assign_material(obj, [material_loaded])
 
-			# Assign material to highpoly
-			for obj in (set.objects_high+set.objects_float):
-				assign_vertex_color(mode, obj)
-				assign_material(obj, [material_loaded])
 
+	# Setup Image
+	is_clear = (not bake_single) or (bake_single and s==0)
+	image = setup_image(mode, name_texture, render_width, render_height, path, is_clear)
 
-		# Setup Image
-		is_clear = (not bake_single) or (bake_single and s==0)
-		image = setup_image(mode, name_texture, render_width, render_height, path, is_clear)
+	# Assign bake node to Material
+	setup_image_bake_node(set.objects_low[0], image)
+	
 
-		# Assign bake node to Material
-		setup_image_bake_node(set.objects_low[0], image)
-		
+	print("Bake '{}' = {}".format(set.name, path))
 
-		print("Bake '{}' = {}".format(set.name, path))
+	# Bake each low poly object in this set
+	for i in range(len(set.objects_low)):
+		obj_low = set.objects_low[i]
+		obj_cage = None if i >= len(set.objects_cage) else set.objects_cage[i]
 
-		# Bake each low poly object in this set
-		for i in range(len(set.objects_low)):
-			obj_low = set.objects_low[i]
-			obj_cage = None if i >= len(set.objects_cage) else set.objects_cage[i]
+		bpy.context.scene.objects.active = obj_low
 
-			bpy.context.scene.objects.active = obj_low
+		bpy.ops.object.select_all(action='DESELECT')
+		for obj_high in (set.objects_high):
+			obj_high.select = True
+		obj_low.select = True
+		cycles_bake(
+			mode, 
+			padding,
+			sampling_scale, 
+			samples, 
+			ray_distance,
+			 len(set.objects_high) > 0, 
+			 obj_cage
+		)
 
+		# Bake Floaters seperate?
+		if len(set.objects_float) > 0:
 			bpy.ops.object.select_all(action='DESELECT')
-			for obj_high in (set.objects_high):
+			for obj_high in (set.objects_float):
 				obj_high.select = True
 			obj_low.select = True
 			cycles_bake(
 				mode, 
-				bpy.context.scene.texToolsSettings.padding,
+				0,
 				sampling_scale, 
 				samples, 
-				ray_distance,
-				 len(set.objects_high) > 0, 
+				ray_distance, 
+				len(set.objects_float) > 0,
 				 obj_cage
 			)
 
-			# Bake Floaters seperate?
-			if len(set.objects_float) > 0:
-				bpy.ops.object.select_all(action='DESELECT')
-				for obj_high in (set.objects_float):
-					obj_high.select = True
-				obj_low.select = True
-				cycles_bake(
-					mode, 
-					0,
-					sampling_scale, 
-					samples, 
-					ray_distance, 
-					len(set.objects_float) > 0,
-					 obj_cage
-				)
-
-
-		# Downsample image?
-		if not bake_single or (bake_single and s == len(sets)-1):
-			# When baking single, only downsample on last bake
-			if render_width != size[0] or render_height != size[1]:
-				image.scale(width,height)
-			
-			# image.save()
-		
+
+	# Downsample and save the finished image
+	if not bake_single or (bake_single and s == len(sets)-1):
+		# When baking single, only downsample on last bake
+		if render_width != size[0] or render_height != size[1]:
+			image.scale(size[0], size[1])
+
+		if is_save:
+			image.filepath_raw = path
+			image.save()
+
 
 
 def setup_image(mode, name, width, height, path, is_clear):#
@@ -236,9 +513,6 @@ def setup_image(mode, name, width, height, path, is_clear):#
 
 	image.file_format = 'TARGA'
 
-	# TODO: Verify that the path exists
-	# image.filepath_raw = path
-
 	return image
 
 
@@ -265,9 +539,17 @@ def setup_image_bake_node(obj, image):
 
 
 
-def assign_vertex_color(mode, obj):
-	if modes[mode].setVertexColor:
-		modes[mode].setVertexColor(obj)
+# Generate the vertex colors of a mode, skipped if the last generated colors of
+# the object came from the same generator
+def assign_vertex_color(mode, obj, vertex_colors=None):
+	generator = modes[mode].setVertexColor
+	if generator is None:
+		return
+	if vertex_colors is not None and vertex_colors.get(obj) == generator:
+		return
+	generator(obj)
+	if vertex_colors is not None:
+		vertex_colors[obj] = generator
 
 
 
@@ -280,6 +562,16 @@ def assign_material(obj, preferred_materials):
 				obj.active_material_index = len(obj.data.materials)-1
 				return
 
+	elif len(obj.data.materials) == 1 and obj.data.materials[0] and obj.data.materials[0].name in materials:
+		for material in preferred_materials:
+			if material:
+				# Swap the material assigned by the bake of another mode
+				obj.data.materials[0] = material
+				return
+
+		# Modes without material bake the object's own shading
+		obj.data.materials.pop(0)
+
 
 
 def get_material(mode):
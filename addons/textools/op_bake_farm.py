@@ -0,0 +1,308 @@
+import bpy
+import os
+import sys
+import json
+import time
+import subprocess
+
+from . import settings
+from . import utilities_bake
+from . import op_bake
+
+
+class op(bpy.types.Operator):
+	bl_idname = "uv.textools_bake_farm"
+	bl_label = "Bake Farm"
+	bl_description = "Bake the sets in parallel background Blender processes, each with a share of the CPU threads. Requires a saved .blend file. Press ESC to cancel"
+
+	workers = bpy.props.IntProperty(name="Workers", description="Number of background Blender processes", default=4, min=1, max=64)
+
+	_timer = None
+
+	@classmethod
+	def poll(cls, context):
+		if len(settings.sets) == 0:
+			return False
+		if settings.bake_job:
+			return False
+		if not bpy.data.is_saved:
+			return False
+		if bpy.context.scene.texToolsSettings.bake_force_single:
+			return False
+		return True
+
+	def execute(self, context):
+		# Blocking: wait for all workers
+		if not self.start(context):
+			return {'CANCELLED'}
+		while settings.bake_job.step():
+			time.sleep(0.5)
+		self.finish(context)
+		return {'FINISHED'}
+
+	def invoke(self, context, event):
+		if not self.start(context):
+			return {'CANCELLED'}
+		self._timer = context.window_manager.event_timer_add(1.0, context.window)
+		context.window_manager.modal_handler_add(self)
+		return {'RUNNING_MODAL'}
+
+	def modal(self, context, event):
+		farm = settings.bake_job
+		if event.type == 'ESC':
+			farm.cancel()
+			self.report({'WARNING'}, "Bake farm cancelled after {}/{} sets".format(len(farm.done), len(farm.sets)))
+			self.finish(context)
+			return {'CANCELLED'}
+
+		if event.type == 'TIMER':
+			if not farm.step():
+				self.finish(context)
+				return {'FINISHED'}
+			context.window_manager.progress_update(len(farm.done) + len(farm.failed))
+			for area in context.screen.areas:
+				area.tag_redraw()
+
+		return {'PASS_THROUGH'}
+
+
+	def start(self, context):
+		for mode in op_bake.get_bake_modes():
+			if mode not in op_bake.modes:
+				self.report({'ERROR_INVALID_INPUT'}, "Uknown mode '{}' only available: '{}'".format(mode, ", ".join(op_bake.modes.keys() )) )
+				return False
+
+		settings.bake_job = BakeFarm(
+			modes = op_bake.get_bake_modes(),
+			sets = list(settings.sets),
+			workers = self.workers,
+
+			size = bpy.context.scene.texToolsSettings.size,
+
+			sampling_scale = int(bpy.context.scene.texToolsSettings.bake_sampling),
+			samples = bpy.context.scene.texToolsSettings.bake_samples,
+			ray_distance = bpy.context.scene.texToolsSettings.bake_ray_distance,
+			padding = bpy.context.scene.texToolsSettings.padding,
+			is_incremental = bpy.context.scene.texToolsSettings.bake_incremental
+		)
+		context.window_manager.progress_begin(0, len(settings.bake_job.sets))
+		return True
+
+
+	def finish(self, context):
+		if self._timer:
+			context.window_manager.event_timer_remove(self._timer)
+			self._timer = None
+		context.window_manager.progress_end()
+
+		farm = settings.bake_job
+		farm.finish()
+		settings.bake_job = None
+
+		for error in farm.errors:
+			print(error)
+		if len(farm.failed) > 0:
+			self.report({'WARNING'}, "Baked {}/{} sets, failed: {}".format(len(farm.done), len(farm.sets), ", ".join(farm.failed)))
+		else:
+			self.report({'INFO'}, "Baked {} sets with {} workers in {:.0f}s".format(len(farm.done), len(farm.processes), time.time() - farm.time_start))
+
+		for area in context.screen.areas:
+			area.tag_redraw()
+
+
+
+# Coordinator of the worker processes. The scene is saved as a copy next to the
+# .blend so the textures of the workers end up next to the original file. Each
+# worker gets a json job file with its set names and writes its progress into a
+# json result file after every set.
+class BakeFarm:
+	def __init__(self, modes, sets, workers, size, sampling_scale, samples, ray_distance, padding, is_incremental):
+		self.modes = modes
+		self.sets = sets
+		self.done = []
+		self.failed = []
+		self.errors = []
+		self.time_start = time.time()
+		self.processes = []
+
+		groups = get_worker_sets(sets, workers)
+		threads = max(1, (os.cpu_count() or 1) // len(groups))
+
+		# Disable edit mode
+		if bpy.context.scene.objects.active != None and bpy.context.object.mode != 'OBJECT':
+			bpy.ops.object.mode_set(mode='OBJECT')
+
+		# The workers rebuild the sets from the selection of the copy
+		self.path_blend = bpy.path.abspath("//textools_bake_farm.blend")
+		selected_objects = [obj for obj in bpy.context.selected_objects]
+		bpy.ops.object.select_all(action='DESELECT')
+		for set in sets:
+			for obj in (set.objects_low + set.objects_high + set.objects_cage + set.objects_float):
+				obj.select = True
+		bpy.ops.wm.save_as_mainfile(filepath=self.path_blend, copy=True)
+		bpy.ops.object.select_all(action='DESELECT')
+		for obj in selected_objects:
+			obj.select = True
+
+		expression = "import {0}.op_bake_farm; {0}.op_bake_farm.worker()".format(__package__)
+		for i in range(len(groups)):
+			path_job = bpy.path.abspath("//textools_bake_farm_{}.json".format(i))
+			path_result = bpy.path.abspath("//textools_bake_farm_{}_result.json".format(i))
+			if os.path.isfile(path_result):
+				os.remove(path_result)
+
+			with open(path_job, 'w') as file:
+				json.dump({
+					'index':i, 'modes':modes, 'sets':[set.name for set in groups[i]], 'threads':threads,
+					'size':[size[0], size[1]], 'sampling':sampling_scale, 'samples':samples,
+					'ray_distance':ray_distance, 'padding':padding, 'incremental':is_incremental,
+					'result':path_result
+				}, file)
+
+			print("Bake farm worker {}: {}".format(i, ", ".join(set.name for set in groups[i])))
+			process = subprocess.Popen([bpy.app.binary_path, "-b", self.path_blend, "--python-expr", expression, "--", path_job])
+			self.processes.append((process, groups[i], path_job, path_result))
+
+
+	# Collect the progress of the workers, returns False when all have exited
+	def step(self):
+		self.done = []
+		self.failed = []
+		is_running = False
+		for process, sets, path_job, path_result in self.processes:
+			result = read_result(path_result)
+			self.done.extend(result['done'])
+			self.failed.extend(result['failed'])
+			if process.poll() is None:
+				is_running = True
+		return is_running
+
+
+	def cancel(self):
+		for process, sets, path_job, path_result in self.processes:
+			if process.poll() is None:
+				process.terminate()
+		for process, sets, path_job, path_result in self.processes:
+			process.wait()
+
+
+	def finish(self):
+		self.step()
+		self.errors = []
+		for process, sets, path_job, path_result in self.processes:
+			result = read_result(path_result)
+			self.errors.extend(result['errors'])
+
+			# A crashed worker fails all of its remaining sets
+			names = result['done'] + result['failed']
+			missing = [set.name for set in sets if set.name not in names]
+			if len(missing) > 0:
+				self.failed.extend(missing)
+				self.errors.append("Worker exited with code {} before baking: {}".format(process.returncode, ", ".join(missing)))
+
+			for path in [path_job, path_result]:
+				if os.path.isfile(path):
+					os.remove(path)
+
+		if os.path.isfile(self.path_blend):
+			os.remove(self.path_blend)
+
+		# Show the new textures in this session
+		for name in self.done:
+			for mode in self.modes:
+				path = op_bake.get_texture_path(name, mode)
+				if os.path.isfile(path):
+					image = bpy.data.images.load(path, check_existing=True)
+					image.reload()
+
+
+	def get_progress(self):
+		return (len(self.done) + len(self.failed)) / max(len(self.sets), 1)
+
+
+	def get_status(self):
+		count = len(self.done) + len(self.failed)
+		status = "{} workers, {}/{} sets".format(len(self.processes), count, len(self.sets))
+		if count == 0:
+			return status
+		eta = (time.time() - self.time_start) / count * (len(self.sets) - count)
+		return "{}, {}:{:02d} left".format(status, int(eta) // 60, int(eta) % 60)
+
+
+
+# Split the sets into groups of about equal cost, the largest sets first
+def get_worker_sets(sets, workers):
+	costs = {}
+	for set in sets:
+		costs[set] = 1 + sum(len(obj.data.polygons) for obj in (set.objects_low + set.objects_high + set.objects_float))
+
+	groups = [[] for i in range(max(1, min(workers, len(sets))))]
+	totals = [0] * len(groups)
+	for set in sorted(sets, key=lambda set: costs[set], reverse=True):
+		i = totals.index(min(totals))
+		groups[i].append(set)
+		totals[i] += costs[set]
+	return groups
+
+
+
+def read_result(path):
+	result = {'done':[], 'failed':[], 'errors':[]}
+	if os.path.isfile(path):
+		try:
+			with open(path) as file:
+				result.update(json.load(file))
+		except (IOError, ValueError):
+			# Partially written by the worker, read again on the next step
+			pass
+	return result
+
+
+
+# Entry point of a background worker: blender -b <copy.blend> --python-expr ... -- <job.json>
+def worker():
+	path_job = sys.argv[sys.argv.index("--") + 1]
+	with open(path_job) as file:
+		job = json.load(file)
+
+	bpy.context.scene.render.threads_mode = 'FIXED'
+	bpy.context.scene.render.threads = job['threads']
+
+	settings.sets = [set for set in utilities_bake.get_bake_sets() if set.name in job['sets']]
+	utilities_bake.store_bake_settings()
+
+	bake_job = op_bake.BakeJob(
+		modes = job['modes'],
+		sets = settings.sets,
+		size = job['size'],
+		bake_single = False,
+		sampling_scale = job['sampling'],
+		samples = job['samples'],
+		ray_distance = job['ray_distance'],
+		padding = job['padding'],
+		is_resume = False,
+		is_incremental = job['incremental']
+	)
+	# Each worker keeps its own resume file
+	bake_job.path_job = bpy.path.abspath("//textools_bake_{}_{}.json".format("_".join(bake_job.modes), job['index']))
+
+	log = WorkerLog()
+	while True:
+		is_running = bake_job.step(log)
+		with open(job['result']+".tmp", 'w') as file:
+			json.dump({'done':bake_job.done, 'failed':bake_job.failed, 'errors':log.errors}, file)
+		os.replace(job['result']+".tmp", job['result'])
+		if not is_running:
+			break
+	bake_job.finish()
+
+
+
+# Collects the reports of a bake job in a worker
+class WorkerLog:
+	def __init__(self):
+		self.errors = []
+
+	def report(self, type, message):
+		print(message)
+		self.errors.append(message)
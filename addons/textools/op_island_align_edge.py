@@ -44,13 +44,14 @@ class op(bpy.types.Operator):
 
 	def execute(self, context):
 		#Store selection
-		utilities_uv.selection_store()
+		snapshot = utilities_uv.selection_store()
 
 		main(context)
 
 		#Restore selection
-		utilities_uv.selection_restore()
+		utilities_uv.selection_restore(snapshot)
 
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
@@ -2,12 +2,15 @@ import bpy
 import bmesh
 import operator
 import math
+import numpy
 
 from mathutils import Vector
 from collections import defaultdict
 
 
 from . import utilities_uv
+from . import utilities_buffer
+from . import utilities_pack
 import imp
 imp.reload(utilities_uv)
 
@@ -21,6 +24,14 @@ class op(bpy.types.Operator):
 
 	is_vertical = bpy.props.BoolProperty(description="Vertical or Horizontal orientation", default=True)
 	padding = bpy.props.FloatProperty(description="Padding between UV islands", default=0.05)
+	is_pack = bpy.props.BoolProperty(description="Pack islands into the 0-1 UV square instead of a single row", default=False)
+	rotate_mode = bpy.props.EnumProperty(items= 
+		[('WIDTH', 'Min Width', 'Rotate islands to the smallest bounds width (exact)'), 
+		('AREA', 'Min Area', 'Rotate islands to the smallest bounds area (exact)'),
+		('SEARCH', 'Search', 'Rotate islands with the step by step angle search')], 
+		name = "Rotate", 
+		default = 'SEARCH'
+	)
 
 	@classmethod
 	def poll(cls, context):
@@ -51,15 +62,16 @@ class op(bpy.types.Operator):
 
 
 	def execute(self, context):
-		main(context, self.is_vertical, self.padding)
+		main(context, self.is_vertical, self.padding, self.rotate_mode, self.is_pack)
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
-def main(context, isVertical, padding):
+def main(context, isVertical, padding, rotate_mode='SEARCH', isPack=False):
 	print("Executing IslandsAlignSort main {}".format(padding))
    	
 	#Store selection
-	utilities_uv.selection_store()
+	snapshot = utilities_uv.selection_store()
 
 	if bpy.context.space_data.pivot_point != 'CENTER':
 		bpy.context.space_data.pivot_point = 'CENTER'
@@ -75,56 +87,79 @@ def main(context, isVertical, padding):
 	boundsAll = utilities_uv.getSelectionBBox()
 
 
-	islands = utilities_uv.getSelectionIslands()
+	islands = utilities_uv.get_selection_islands_indices(bm, uvLayer)
 	allSizes = {}	#https://stackoverflow.com/questions/613183/sort-a-python-dictionary-by-value
-	allBounds = {}
 
 	print("Islands: "+str(len(islands))+"x")
 
-	bpy.context.window_manager.progress_begin(0, len(islands))
-
 	#Rotate to minimal bounds
+	if rotate_mode == 'SEARCH':
+		bpy.context.window_manager.progress_begin(0, len(islands))
+		bm.faces.ensure_lookup_table()
+		for i in range(0, len(islands)):
+			alignIslandMinimalBounds(uvLayer, [bm.faces[index] for index in islands[i]])
+			bpy.context.window_manager.progress_update(i)
+		bpy.context.window_manager.progress_end()
+
+	buffer = utilities_buffer.UVBuffer(bpy.context.active_object)
+	islands_loops = utilities_uv.get_island_loops(buffer, islands)
+
+	if rotate_mode != 'SEARCH':
+		for loops in islands_loops:
+			utilities_uv.align_island_minimal_bounds(buffer.uvs, loops, rotate_mode)
+
+	# Collect BBox sizes of all islands at once
+	allBounds = utilities_uv.get_bbox_islands(buffer, islands)
 	for i in range(0, len(islands)):
-		alignIslandMinimalBounds(uvLayer, islands[i])
+		allSizes[i] = max(allBounds['width'][i], allBounds['height'][i]) + i*0.000001;#Make each size unique
+
+
+	if isPack:
+		pack(buffer, islands_loops, allBounds, padding)
+	else:
+		sort(buffer, islands_loops, allBounds, boundsAll, allSizes, isVertical, padding)
+
+	# Write all islands back at once
+	buffer.write()
+
+	#Restore selection
+	utilities_uv.selection_restore(snapshot)
+
 
-		# Collect BBox sizes
-		bounds = utilities_uv.getSelectionBBox()
-		allSizes[i] = max(bounds['width'], bounds['height']) + i*0.000001;#Make each size unique
-		allBounds[i] = bounds;
-		print("Rotate compact:  "+str(allSizes[i]))
 
-		bpy.context.window_manager.progress_update(i)
+def pack(buffer, islands_loops, allBounds, padding):
+	size_x = bpy.context.scene.texToolsSettings.size[0]
+	size_y = bpy.context.scene.texToolsSettings.size[1]
+	padding_px = padding * min(size_x, size_y)
 
-	bpy.context.window_manager.progress_end()
+	sizes = numpy.column_stack((allBounds['width'], allBounds['height']))
+	scale, positions = utilities_pack.pack_islands(sizes, size_x, size_y, padding_px)
+	print("Pack {}x islands, scale {:.4f}".format(len(islands_loops), scale))
 
+	for i in range(len(islands_loops)):
+		loops = islands_loops[i]
+		buffer.uvs[loops] = (buffer.uvs[loops] - allBounds['min'][i]) * scale + positions[i]
 
+
+
+def sort(buffer, islands_loops, allBounds, boundsAll, allSizes, isVertical, padding):
 	#Position by sorted size in row
 	sortedSizes = sorted(allSizes.items(), key=operator.itemgetter(1))#Sort by values, store tuples
 	sortedSizes.reverse()
 	offset = 0.0
 	for sortedSize in sortedSizes:
 		index = sortedSize[0]
-		island = islands[index]
-		bounds = allBounds[index]
+		bounds_min = allBounds['min'][index]
+		bounds_max = allBounds['max'][index]
 
-		#Select Island
-		bpy.ops.uv.select_all(action='DESELECT')
-		utilities_uv.setSelectedFaces(island)
-		
 		#Offset Island
+		delta = Vector((boundsAll['min'].x - bounds_min[0], boundsAll['max'].y - bounds_max[1]));
 		if(isVertical):
-			delta = Vector((boundsAll['min'].x - bounds['min'].x, boundsAll['max'].y - bounds['max'].y));
-			bpy.ops.transform.translate(value=(delta.x, delta.y-offset, 0))
-			offset += bounds['height']+padding
+			buffer.uvs[islands_loops[index]] += (delta.x, delta.y-offset)
+			offset += allBounds['height'][index]+padding
 		else:
-			print("Horizontal")
-			delta = Vector((boundsAll['min'].x - bounds['min'].x, boundsAll['max'].y - bounds['max'].y));
-			bpy.ops.transform.translate(value=(delta.x+offset, delta.y, 0))
-			offset += bounds['width']+padding
-
-
-	#Restore selection
-	utilities_uv.selection_restore()
+			buffer.uvs[islands_loops[index]] += (delta.x+offset, delta.y)
+			offset += allBounds['width'][index]+padding
 
 
 def alignIslandMinimalBounds(uvLayer, faces):
@@ -135,12 +170,12 @@ def alignIslandMinimalBounds(uvLayer, faces):
 	steps = 8
 	angle = 45;	# Starting Angle, half each step
 
-	bboxPrevious = utilities_uv.getSelectionBBox()
+	bboxPrevious = utilities_uv.get_bbox_faces(uvLayer, faces)
 
 	for i in range(0, steps):
 		# Rotate right
 		bpy.ops.transform.rotate(value=(angle * math.pi / 180), axis=(0, 0, 1))
-		bbox = utilities_uv.getSelectionBBox()
+		bbox = utilities_uv.get_bbox_faces(uvLayer, faces)
 
 		if i == 0:
 			sizeA = bboxPrevious['width'] * bboxPrevious['height']
@@ -156,7 +191,7 @@ def alignIslandMinimalBounds(uvLayer, faces):
 		else:
 			# Rotate Left
 			bpy.ops.transform.rotate(value=(-angle*2 * math.pi / 180), axis=(0, 0, 1))
-			bbox = utilities_uv.getSelectionBBox()
+			bbox = utilities_uv.get_bbox_faces(uvLayer, faces)
 			if bbox['minLength'] < bboxPrevious['minLength']:
 				bboxPrevious = bbox;	# Success
 			else:
@@ -2,12 +2,15 @@ import bpy
 import os
 import bmesh
 import math
-import operator
+import numpy
+import hashlib
 from mathutils import Vector
+from mathutils.kdtree import KDTree
 from collections import defaultdict
-from itertools import chain # 'flattens' collection of iterables
 
+from . import settings
 from . import utilities_uv
+from .utilities_buffer import UVBuffer, foreach_get
 
 
 
@@ -16,8 +19,15 @@ class op(bpy.types.Operator):
 	bl_label = "Symmetry"
 	bl_description = "Mirrors selected faces to other half or averages based on selected edge center"
 	bl_options = {'REGISTER', 'UNDO'}
-	
+
 	is_stack = bpy.props.BoolProperty(description="Stack the halves on top of each other?", default=False)
+	mode = bpy.props.EnumProperty(items= 
+		[('POSITION', 'Position', 'Pair vertices by their mirrored 3D position'), 
+		('TOPOLOGY', 'Topology', 'Pair vertices by walking the mesh outward from the center edges, for posed or asymmetric meshes')], 
+		name = "Mode", 
+		default = 'POSITION'
+	)
+	tolerance = bpy.props.FloatProperty(name="Tolerance", description="Maximum distance of mirrored 3D vertices, relative to the island size", default=0.01, min=0.0, max=1.0)
 
 	@classmethod
 	def poll(cls, context):
@@ -46,745 +56,343 @@ class op(bpy.types.Operator):
 		if bpy.context.scene.tool_settings.uv_select_mode != 'EDGE' and bpy.context.scene.tool_settings.uv_select_mode != 'FACE':
 		 	return False
 
-		# if bpy.context.scene.tool_settings.use_uv_select_sync:
-		# 	return False
-
 		return True
 
 	def execute(self, context):
-		main(context)
+		main(self, context, self.is_stack, self.mode, self.tolerance)
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
 
-def main(context):
-	print("--------------------------- Executing operator_mirror")
-
-	#Store selection
-	utilities_uv.selection_store()
-
-	bm = bmesh.from_edit_mesh(bpy.context.active_object.data)
+# Mirror a UV island along its symmetry line. In edge mode the selected edges are the
+# center and both halves are averaged, in face mode the selected faces are one half
+# and get copied onto the other. Vertex pairs come from the 3D symmetry of the mesh
+# or, in topology mode, from walking the mesh outward from the center edges.
+def main(self, context, is_stack, mode, tolerance):
+	obj = bpy.context.active_object
+	bm = bmesh.from_edit_mesh(obj.data)
 	uvLayer = bm.loops.layers.uv.verify()
-
-	if bpy.context.scene.tool_settings.uv_select_mode == 'EDGE':
-
-
-		# 1.) Collect left and right side verts
-		verts_middle = [];
-
-		for face in bm.faces:
-			if face.select:
-				for loop in face.loops:
-					if loop[uvLayer].select and loop.vert not in verts_middle:
-						verts_middle.append(loop.vert)
-					
-		# 2.) Align UV shell
-		alignToCenterLine()
-
-		# Convert to Vert selection and extend edge loop in 3D space
-		bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='VERT')
-		bpy.ops.mesh.select_all(action='DESELECT')
-		for vert in verts_middle:
-			vert.select = True
-
-		bpy.ops.mesh.select_mode(use_extend=True, use_expand=False, type='EDGE')
-		bpy.ops.mesh.loop_multi_select(ring=False)
-		for vert in bm.verts:
-			if vert.select and vert not in verts_middle:
-				print("Append extra vert to symmetry line from xyz edge loop")
-				verts_middle.append(vert)
-
-		# Select UV shell Again
-		bpy.ops.mesh.select_linked(delimit={'UV'})
-		verts_island = []
-		for vert in bm.verts:
-			if vert.select:
-				verts_island.append(vert)
-
-
-		# 3.) Restore UV vert selection
-		x_middle = 0
-		bpy.ops.uv.select_all(action='DESELECT')
-		for face in bm.faces:
-			if face.select:
-				for loop in face.loops:
-					if loop.vert in verts_middle:
-						loop[uvLayer].select = True
-						x_middle = loop[uvLayer].uv.x;
-
-
-		print("Middle "+str(len(verts_middle))+"x, x pos: "+str(x_middle))
-
-		# Extend selection
-		bpy.ops.uv.select_more()
-		verts_A = [];
-		verts_B = [];
-		for face in bm.faces:
-			if face.select:
-				for loop in face.loops:
-					if loop[uvLayer].select and loop.vert not in verts_middle:
-						if loop[uvLayer].uv.x <= x_middle:
-							# Left
-							if loop.vert not in verts_A:
-								verts_A.append(loop.vert)
-
-						elif loop[uvLayer].uv.x > x_middle:
-							# Right
-							if loop.vert not in verts_B:
-								verts_B.append(loop.vert)
-
-		
-
-		
-		def remove_doubles():
-			verts_double = [vert for vert in verts_island if (vert in verts_A and vert in verts_B)]
-
-			# print("Temp  double: "+str(len(verts_double))+"x")
-			if len(verts_double) > 0:
-				print("TODO: Remove doubles "+str(len(verts_double)))
-				for vert in verts_double:
-					verts_A.remove(vert)
-					verts_B.remove(vert)
-					verts_middle.append(vert)
-
-		def extend_half_selection(verts_middle, verts_half, verts_other):
-			# Select initial half selection
-			bpy.ops.uv.select_all(action='DESELECT')
-			for face in bm.faces:
-				if face.select:
-					for loop in face.loops:
-						if loop.vert in verts_half:
-							loop[uvLayer].select = True
-
-			# Extend selection				
-			bpy.ops.uv.select_more()
-
-			# count_added = 0
-			for face in bm.faces:
-				if face.select:
-					for loop in face.loops:
-						if loop.vert not in verts_half and loop.vert not in verts_middle and loop[uvLayer].select:
-							verts_half.append(loop.vert)
-
-
-		remove_doubles()
-
-		# Limit iteration loops
-		max_loops_extend = 200
-		for i in range(0, max_loops_extend):
-			print("Now extend selection A / B")
-			count_hash = str(len(verts_A))+"_"+str(len(verts_B));
-			extend_half_selection(verts_middle, verts_A, verts_B)
-			extend_half_selection(verts_middle, verts_B, verts_A)
-			remove_doubles()
-
-			count_hash_new = str(len(verts_A))+"_"+str(len(verts_B));
-			if count_hash_new == count_hash:
-				print("Break loop, same as previous loop")
-				break;
-
-		print("Edge, Sides: L:"+str(len(verts_A))+" | R:"+str(len(verts_B)))
-
-		# 4.) Mirror Verts
-		mirror_verts(verts_middle, verts_A, verts_B, False)
-
-
-	if bpy.context.scene.tool_settings.uv_select_mode == 'FACE':
-
-		# 1.) Get selected UV faces to vert faces
-		selected_faces = []
-		for face in bm.faces:
-			if face.select:
-				# Are all UV faces selected?
-				countSelected = 0
-				for loop in face.loops:
-					if loop[uvLayer].select:
-						countSelected+=1
-						# print("Vert selected "+str(face.index))
-				if countSelected == len(face.loops):
-					selected_faces.append(face)
-
-
-		# if bpy.context.scene.tool_settings.use_uv_select_sync == False:
-
-		bpy.ops.uv.select_linked(extend=False)
-		verts_all = []
-		for face in bm.faces:
-			if face.select:
-				for loop in face.loops:
-					if(loop.vert not in verts_all):
-						verts_all.append(loop.vert)
-
-		print("Verts shell: "+str(len(verts_all)))
-
-
-		bpy.ops.mesh.select_all(action='DESELECT')
-		for face in selected_faces:
-			face.select = True
-
-
-		# 2.) Select Vert shell's outer edges
-		bpy.ops.mesh.select_linked(delimit=set())
-		bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='EDGE')
-		bpy.ops.mesh.region_to_loop()
-		edges_outer_shell = [e for e in bm.edges if e.select]
-
-		# 3.) Select Half's outer edges
-		bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='FACE')
-		bpy.ops.mesh.select_all(action='DESELECT')
-		for face in selected_faces:
-			face.select = True
-		bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='EDGE')
-		bpy.ops.mesh.region_to_loop()
-		edges_outer_selected = [e for e in bm.edges if e.select]
-
-		# 4.) Mask edges exclusive to edges_outer_selected (symmetry line)
-		edges_middle = [item for item in edges_outer_selected if item not in edges_outer_shell]
-
-		# 5.) Convert to UV selection
-		verts_middle = []
-		for edge in edges_middle:
-			if edge.verts[0] not in verts_middle:
-				verts_middle.append(edge.verts[0])
-			if edge.verts[1] not in verts_middle:
-				verts_middle.append(edge.verts[1])
-
-		#Select all Vert shell faces
-		bpy.ops.mesh.select_linked(delimit=set())
-		#Select UV matching vert array
-		bpy.ops.uv.select_all(action='DESELECT')
-		for face in bm.faces:
-			if face.select:
-				for loop in face.loops:
-					if loop.vert in verts_middle:
-						loop[uvLayer].select = True
-
-		# 5.) Align UV shell
-		alignToCenterLine()
-
-		# 7.) Collect left and right side verts
-		verts_A = [];
-		verts_B = [];
-
-		bpy.ops.uv.select_all(action='DESELECT')
-		for face in selected_faces:
+	is_face_mode = bpy.context.scene.tool_settings.uv_select_mode == 'FACE'
+
+	islands = utilities_uv.get_selection_islands_indices(bm, uvLayer)
+	if len(islands) != 1:
+		self.report({'ERROR_INVALID_INPUT'}, "Select the center edges or one half of a single UV island")
+		return
+
+	bm.faces.ensure_lookup_table()
+	faces_island = [bm.faces[index] for index in islands[0]]
+
+	# 1.) Center edges (as the loop starting each edge) and the faces of side A
+	faces_A, edges_center = get_center_edges(faces_island, uvLayer, is_face_mode)
+	if len(edges_center) == 0:
+		self.report({'ERROR_INVALID_INPUT'}, "No symmetry line found, select the center edges or one half of the island")
+		return
+
+	verts_center = set(vert.index for loop in edges_center for vert in (loop.vert, loop.link_loop_next.vert))
+	verts_A = set(vert.index for face in faces_A for vert in face.verts) - verts_center
+	bm.edges.index_update()
+	edges_index = numpy.unique([loop.edge.index for loop in edges_center])
+	edges_face, edges_position = numpy.array([get_loop_position(loop) for loop in edges_center]).T
+
+	buffer = UVBuffer(obj)
+	loops = buffer.get_face_loops(islands[0])
+	edges_start = buffer.face_loop_start[edges_face] + edges_position
+	edges_end = buffer.face_loop_start[edges_face] + (edges_position + 1) % buffer.face_loop_total[edges_face]
+
+	# 2.) Align the symmetry line vertically
+	x_middle = align_center_line(buffer.uvs, loops, buffer.uvs[edges_start], buffer.uvs[edges_end])
+
+	# 3.) Pair the vertices of both halves
+	verts = buffer.loop_verts[loops]
+	uv_verts, is_single = get_vertex_uvs(buffer.uvs, loops, verts, buffer.count_verts)
+
+	if mode == 'TOPOLOGY':
+		pairs = get_topology_pairs_cached(obj, buffer, islands[0], faces_island, faces_A, edges_center, edges_index)
+		if pairs is None:
+			self.report({'ERROR_INVALID_INPUT'}, "The halves of the island don't have the same topology")
+			return
+
+		pairs_A, pairs_B, centers = pairs
+		print("Mirror topology: center {}x, pairs {}x".format(len(centers), len(pairs_A)))
+		apply_mirror(buffer, loops, verts, uv_verts, is_single, pairs_A, pairs_B, centers, x_middle, not is_face_mode, is_stack)
+		buffer.write()
+		return
+
+	co = foreach_get(obj.data.vertices, 'co', buffer.count_verts, 3, numpy.float64)
+
+	verts_island = numpy.unique(verts)
+	is_center = numpy.zeros(buffer.count_verts, dtype=bool)
+	is_center[list(verts_center)] = True
+	if is_face_mode:
+		is_A = numpy.zeros(buffer.count_verts, dtype=bool)
+		is_A[list(verts_A)] = True
+	else:
+		is_A = uv_verts[:, 0] < x_middle
+	side_A = verts_island[is_A[verts_island] & ~is_center[verts_island]]
+	side_B = verts_island[~is_A[verts_island] & ~is_center[verts_island]]
+
+	size = numpy.linalg.norm(co[verts_island].max(axis=0) - co[verts_island].min(axis=0))
+	plane = get_symmetry_plane(co[list(verts_center)], co[side_A], co[side_B])
+	if plane is None:
+		self.report({'ERROR_INVALID_INPUT'}, "The island has no 3D symmetry")
+		return
+
+	pairs_A, pairs_B, centers = get_mirror_pairs(co, side_A, side_B, plane, tolerance * size)
+	print("Mirror: center {}x, pairs {}x, sides {}x|{}x".format(len(verts_center) + len(centers), len(pairs_A), len(side_A), len(side_B)))
+
+	# 4.) Mirror UV's
+	apply_mirror(buffer, loops, verts, uv_verts, is_single, pairs_A, pairs_B, list(verts_center) + list(centers), x_middle, not is_face_mode, is_stack)
+	buffer.write()
+
+	if len(pairs_A) < min(len(side_A), len(side_B)):
+		self.report({'WARNING'}, "Mirrored {} of {} vertices, increase the tolerance for the rest".format(len(pairs_A), min(len(side_A), len(side_B))))
+
+
+
+# Center edges of an island as BMLoops and the faces of side A. In face mode side A
+# are the selected faces and the center is their border to the rest of the island,
+# in edge mode the center are the selected UV edges.
+def get_center_edges(faces_island, uvLayer, is_face_mode):
+	faces_A = set()
+	edges_center = []
+
+	if is_face_mode:
+		faces_set = set(faces_island)
+		faces_A = set(face for face in faces_island if all(loop[uvLayer].select for loop in face.loops))
+		for face in faces_A:
 			for loop in face.loops:
-				if loop.vert not in verts_middle and loop.vert not in verts_A:
-					verts_A.append(loop.vert)
-
-		for vert in verts_all:
-			if vert not in verts_middle and vert not in verts_A and vert not in verts_B:
-				verts_B.append(vert)
-
-		# 8.) Mirror Verts
-		mirror_verts(verts_middle, verts_A, verts_B, True)
-
-	#Restore selection
-	# utilities_uv.selection_restore()
-
-
-
-
-
-def mirror_verts(verts_middle, verts_A, verts_B, isAToB):
-
-	print("--------------------------------\nMirror: C:"+str(len(verts_middle))+" ; verts: "+str(len(verts_A))+"|"+str(len(verts_B))+"x, 	A to B? "+str(isAToB))
-
-
-	bm = bmesh.from_edit_mesh(bpy.context.active_object.data)
-	uvLayer = bm.loops.layers.uv.verify()
-
-
-	# Get verts_island
-	verts_island = []
-	for vert in verts_middle:
-		verts_island.append(vert)
-	for vert in verts_A:
-		verts_island.append(vert)
-	for vert in verts_B:
-		verts_island.append(vert)
-
-	# Select Island as Faces
-	bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='VERT')
-	bpy.ops.mesh.select_all(action='DESELECT')
-	for vert in verts_island:
-		vert.select = True
-	bpy.ops.mesh.select_mode(use_extend=False, use_expand=True, type='FACE')
-
-	# Collect Librarys of verts / UV
-	vert_to_uv = {}
-	uv_to_vert = {}
-	uv_to_face = {}
-	# UV clusters / groups (within 0.000001 distance)
-	clusters = []
-	uv_to_clusters = {}
-	vert_to_clusters = {}
-
-	for face in bm.faces:
-		if face.select:
+				other = loop.link_loop_radial_next.face
+				if other != face and other in faces_set and other not in faces_A:
+					edges_center.append(loop)
+	else:
+		for face in faces_island:
 			for loop in face.loops:
-				vert = loop.vert
-				uv = loop[uvLayer]
-				
-				# vert_to_uv
-				if vert not in vert_to_uv:
-					vert_to_uv[vert] = [uv];
-				else:
-					vert_to_uv[vert].append(uv)
-
-				# uv_to_vert
-				if uv not in uv_to_vert:
-					uv_to_vert[ uv ] = vert;
-				if uv not in uv_to_face:
-					uv_to_face[ uv ] = face;
-
-				# clusters
-				isMerged = False
-				for cluster in clusters:
-					d = (uv.uv - cluster.uvs[0].uv).length
-					if d <= 0.0000001:
-						#Merge
-						cluster.append(uv)
-						uv_to_clusters[uv] = cluster
-						if vert not in vert_to_clusters:
-							vert_to_clusters[vert] = cluster
-						isMerged = True;
-						break;
-				if not isMerged:
-					#New Group
-					clusters.append( UVCluster(vert, [uv]) )
-					uv_to_clusters[uv] = clusters[-1]
-					if vert not in vert_to_clusters:
-							vert_to_clusters[vert] = clusters[-1]
-
-	# Get Center X
-	x_middle = vert_to_uv[ verts_middle[0] ][0].uv.x;
-	
-
-	# 3.) Grow layer by layer
-	bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='VERT')
-	bpy.context.scene.tool_settings.uv_select_mode = 'VERTEX'
-
-
-	clusters_processed = []
-
-	def select_extend_filter(clusters_border, clusters_mask):
-		# print("Extend A/B")
-		connected_clusters = []
-		for cluster in clusters_border:
-
-			# Select and Extend selection
-			bpy.ops.uv.select_all(action='DESELECT')
-			for uv in cluster.uvs:
-				uv.select = True
-			bpy.ops.uv.select_more()
-
-			# Collect extended
-			uv_extended = [uv for clusterMask in clusters_mask for uv in clusterMask.uvs if (uv.select and clusterMask not in clusters_processed)]
-			clusters_extended = []
-			for uv in uv_extended:
-				if uv_to_clusters[uv] not in clusters_extended:
-					clusters_extended.append( uv_to_clusters[uv] )
-
-			# Sort by distance
-			groups_distance = {}
-			for i in range(0, len(clusters_extended)):
-				sub_group = clusters_extended[i]
-				groups_distance[i] = (cluster.uvs[0].uv - sub_group.uvs[0].uv).length
-			
-			# Append to connected clusters
-			array = []
-			for item in sorted(groups_distance.items(), key=operator.itemgetter(1)):
-				key = item[0]
-				clust = clusters_extended[key]
-				array.append( clust )
-				if clust not in clusters_processed:
-					clusters_processed.append(clust)
-
-			connected_clusters.append( array )
-			
-			if cluster not in clusters_processed:
-				clusters_processed.append( cluster )
-
-
-			bpy.ops.uv.select_all(action='DESELECT')
-			for uv in uv_extended:
-				uv.select = True
-
-
-		return connected_clusters
-
-
-
-
-
-	
-	mask_A = [vert_to_clusters[vert] for vert in verts_A]
-	mask_B = [vert_to_clusters[vert] for vert in verts_B]
-
-	border_A = list([vert_to_clusters[vert] for vert in verts_middle])
-	border_B = list([vert_to_clusters[vert] for vert in verts_middle])
-	
-	for step in range(0, 8):
-
-		if len(border_A) == 0:
-			print("{}.: Finished scanning with no growth iterations".format(step))
-			break;
-		if len(border_A) != len(border_B) or len(border_A) == 0:
-			print("Abort: non compatible border A/B: {}x {}x ".format(len(border_A), len(border_B)))
-			break;
-
-		print("{}.: border {}x|{}x, processed: {}x".format(step, len(border_A), len(border_B), len(clusters_processed)))
-		
-		# Collect connected pairs for each side
-		connected_A = select_extend_filter(border_A, mask_A)
-		connected_B = select_extend_filter(border_B, mask_B)
-
-		print("  Connected: {}x|{}x".format(len(connected_A), len(connected_B)))
-
-		border_A.clear()
-		border_B.clear()
-
-		# Traverse through pairs
-		for i in range(0, min(len(connected_A), len(connected_B)) ):
-			if len(connected_A[i]) == 0:
-				continue
-			if len(connected_A[i]) != len(connected_B[i]):
-				print(".    Error: Inconsistent grow mappings from {}  {}x | {}x".format(i, len(connected_A[i]), len(connected_B[i]) ))
-				continue
+				if loop[uvLayer].select and loop.link_loop_next[uvLayer].select:
+					edges_center.append(loop)
 
-			indexA = [cluster.vertex.index for cluster in connected_A[i] ]
-			indexB = [cluster.vertex.index for cluster in connected_B[i] ]
-			indexA = str(indexA).replace("[","").replace("]","").replace(" ","")
-			indexB = str(indexB).replace("[","").replace("]","").replace(" ","")
-			print(".    Map {}|{} = {}x|{}x".format(indexA, indexB, len(connected_A[i]), len(connected_B[i]) ) )
+	return faces_A, edges_center
 
 
 
-			if True:#isAToB:
-				# Copy A side to B
-				for cluster in connected_B[i]:
-					for uv in cluster.uvs:
-						pos = connected_A[i][0].uvs[0].uv.copy()
-						pos.x = x_middle - (pos.x-x_middle)# Flip cooreindate
-						# uv.uv = pos
-			
-			# border_A[i] = uv_to_clusters[ connected_A[i][0] ] 
-			# border_B[i] = uv_to_clusters[ connected_B[i][0] ] 
-			for j in range(len(connected_A[i])):
-				border_A.append( connected_A[i][j] )
-				border_B.append( connected_B[i][j] )
+# Face index and position of a BMLoop within its face
+def get_loop_position(loop):
+	for k, other in enumerate(loop.face.loops):
+		if other == loop:
+			return loop.face.index, k
 
 
 
-			# for uv in clusters_B[idxB]:
-		# 					pos = clusters_A[idxA][0].uv.copy()
-		# 					# Flip cooreindate
-		# 					pos.x = x_middle - (pos.x-x_middle)
-		# 					uv.uv = pos
+# Rotate the island loops around the center of the given edges (start and end UV's)
+# so the average edge direction is vertical. Returns the x of the symmetry line.
+def align_center_line(uvs, loops, uvs_start, uvs_end):
+	diff = (uvs_end - uvs_start).astype(numpy.float64)
+	center = ((uvs_start + uvs_end) / 2).astype(numpy.float64).mean(axis=0)
 
-			# for j in range(0, len(connected_A[i])):
-			# 	# Group A and B
-			# 	groupA = connected_A[i][j];
-			# 	groupB = connected_B[i][j];
-			# 	# vertexA = [vert_to_clusters[key] for key in vert_to_clusters if vert_to_clusters[key] == groupA]
-			# 	print("...map {} -> {}".format(groupA, groupB))
+	# Average the directions on doubled angles, edges point either way
+	angles = numpy.arctan2(diff[:, 1], diff[:, 0]) * 2
+	angle = math.atan2(numpy.sin(angles).sum(), numpy.cos(angles).sum()) / 2
 
+	utilities_uv.rotate_uvs(uvs, loops, math.pi / 2 - angle, center)
+	return center[0]
 
 
-		# for j in range(0, count):
-		# 	if len(connected_A[j]) != len(connected_B[j]):
-		# 		# print("Error: Inconsistent grow mappings from {}:{}x | {}:{}x".format(border_A[j].index,len(connected_A[j]), border_B[j].index, len(connected_B[j]) ))
-		# 		print("Error: Inconsistent grow mappings from {}  {}x | {}x".format(j, len(connected_A[j]), len(connected_B[j]) ))
-		# 		continue
 
-		# 	for k in range(0, len(connected_A[j])):
-		# 		# Vertex A and B
-		# 		vA = connected_A[j][k];
-		# 		vB = connected_B[j][k];
+# Mean UV of each vertex over the given loops, and whether all its loops share one UV
+def get_vertex_uvs(uvs, loops, verts, count_verts):
+	counts = numpy.maximum(numpy.bincount(verts, minlength=count_verts), 1)
+	uv_verts = numpy.column_stack([
+		numpy.bincount(verts, weights=uvs[loops, i], minlength=count_verts) / counts for i in range(2)
+	])
 
-		# 		uvsA = vert_to_uv[vA];
-		# 		uvsB = vert_to_uv[vB];
+	spread = numpy.zeros(count_verts)
+	numpy.maximum.at(spread, verts, numpy.abs(uvs[loops] - uv_verts[verts]).max(axis=1))
+	return uv_verts, spread < 0.00001
 
-		# 		clusters_A = collect_clusters(uvsA)
-		# 		clusters_B = collect_clusters(uvsB)
 
-		# 		if len(clusters_A) != len(clusters_B):
-		# 			print("Error: Inconsistent vertex UV group pairs at vertex {} : {}".format(vA.index, vB.index))
-		# 			continue
 
+# Symmetry plane (point, normal) through the center verts, facing from side B to
+# side A. Directions the center verts spread along are removed from the normal, so a
+# straight center edge loop still gives a well defined plane. None if the sides match.
+def get_symmetry_plane(co_center, co_A, co_B):
+	if len(co_A) == 0 or len(co_B) == 0:
+		return None
 
-		# 		message= "...Map {0} -> {1}  = UVs {2}|{3}x | UV-Groups {4}x|{5}x".format( vA.index, vB.index, len(uvsA), len(uvsB), len(clusters_A), len(clusters_B) )
-		# 		if len(clusters_A) > 1:
-		# 			message = ">> "+message
-		# 		print(message)
-
-
-
-		# 		if len(clusters_A) > 0:
-		# 			# For each group
-
-		# 			sortA = {}
-		# 			sortB = {}
-		# 			for g in range(0, len(clusters_A)):
-		# 				uv_A = clusters_A[g][0].uv.copy()
-		# 				uv_B = clusters_B[g][0].uv.copy()
-
-		# 				# localize X values (from symmetry line)
-		# 				uv_A.x = (uv_A.x - x_middle)
-		# 				uv_B.x = (uv_B.x - x_middle)
-
-		# 				sortA[g] = abs(uv_A.x) + uv_A.y*2.0
-		# 				sortB[g] = abs(uv_B.x) + uv_B.y*2.0
-		# 				# print("    .   [{}] : {:.2f}, {:.2f} | {:.2f}, {:.2f}".format(g, uv_A.x, uv_A.y, uv_B.x, uv_B.y))
-		# 				print("    .   [{}] : {:.2f} | {:.2f}".format(g, sortA[g], sortB[g]))
-
-		# 			# Sort sortA by value
-		# 			sortedA = sorted(sortA.items(), key=operator.itemgetter(1))
-		# 			sortedB = sorted(sortB.items(), key=operator.itemgetter(1))
-					
-		# 			for g in range(0, len(clusters_A)):
-		# 				# sortedA[g]
-		# 				idxA = sortedA[g][0]
-		# 				idxB = sortedB[g][0]
-
-		# 				print("Map clusters_A {} -> ".format(idxA, idxB))
-		# 				for uv in clusters_B[idxB]:
-		# 					pos = clusters_A[idxA][0].uv.copy()
-		# 					# Flip cooreindate
-		# 					pos.x = x_middle - (pos.x-x_middle)
-		# 					uv.uv = pos
-
-		# 		border_A.append(vA)
-		# 		border_B.append(vB)
-
-
-
-	print("--------------------------------")
-	'''
-
-	def select_extend_filter(verts_border, verts_mask):
-		# print("Extend A/B")
-		connected_verts = []
-		for i in range(0, len(verts_border)):
-			 # Collect connected edge verts
-			verts_connected_edges = []
-			for edge in verts_border[i].link_edges:
-				if(edge.verts[0] not in verts_connected_edges):
-					verts_connected_edges.append(edge.verts[0])
-				if(edge.verts[1] not in verts_connected_edges):
-					verts_connected_edges.append(edge.verts[1])
-
-			# Select vert on border
-			bpy.ops.mesh.select_all(action='DESELECT')
-			verts_border[i].select = True
-			
-
-			# Extend selection
-			bpy.ops.mesh.select_more()
-
-			# Filter selected verts against mask, connected edges, processed and border
-			verts_extended = [vert for vert in bm.verts if (vert.select and vert in verts_connected_edges and vert in verts_mask and vert and vert not in verts_border and vert not in verts_processed)]
-			
-
-			# print("    "+str(i)+". scan: "+str(verts_border[i].index)+"; ext: "+str(len(verts_extended))+"x")
-
-			connected_verts.append( [] )
-
-			# Sort by distance
-			verts_distance = {}
-			for vert in verts_extended:
-				verts_distance[vert] = (verts_border[i].co - vert.co).length
-
-			for item in sorted(verts_distance.items(), key=operator.itemgetter(1)):
-				connected_verts[i].append( item[0] )
-
-			if verts_border[i] not in verts_processed:
-				verts_processed.append(verts_border[i])
-
-		return connected_verts
-
-	# find UV vert blobs , see which ones are same spot
-	def collect_clusters(uvs):
-		groups = []
-		for uv in uvs:
-			if len(groups) == 0:
-				groups.append([uv])
-			else:
-				isMerged = False
-				for group in groups:
-					d = (uv.uv - group[0].uv).length
-					if d <= 0.0000001:
-						#Merge
-						group.append(uv)
-						isMerged = True;
-						break;
-				if not isMerged:
-					#New Group
-					groups.append([uv])
-		return groups
-
-	
-	border_A = [vert for vert in verts_middle]
-	border_B = [vert for vert in verts_middle]
-	
-
-	for i in range(0, 200):
-
-		if len(border_A) == 0:
-			print("Finished scanning at {} growth iterations".format(i))
-			break;
-		if len(border_A) != len(border_B) or len(border_A) == 0:
-			print("Abort: non compatible border A/B: {}x {}x ".format(len(border_A), len(border_B)))
-			break;
-
-		connected_A = select_extend_filter(border_A, verts_A)
-		connected_B = select_extend_filter(border_B, verts_B)
-
-		print("Map pairs: {}|{}".format(len(connected_A), len(connected_B)))
-
-		border_A.clear()
-		border_B.clear()
-
-		count = min(len(connected_A), len(connected_B))
-		for j in range(0, count):
-			if len(connected_A[j]) != len(connected_B[j]):
-				# print("Error: Inconsistent grow mappings from {}:{}x | {}:{}x".format(border_A[j].index,len(connected_A[j]), border_B[j].index, len(connected_B[j]) ))
-				print("Error: Inconsistent grow mappings from {}  {}x | {}x".format(j, len(connected_A[j]), len(connected_B[j]) ))
-				continue
-
-			for k in range(0, len(connected_A[j])):
-				# Vertex A and B
-				vA = connected_A[j][k];
-				vB = connected_B[j][k];
+	point = co_center.mean(axis=0)
+	normal = co_A.mean(axis=0) - co_B.mean(axis=0)
+	if len(co_center) > 1:
+		U, S, Vt = numpy.linalg.svd(co_center - point, full_matrices=False)
+		for k in range(min(2, len(S))):
+			if S[k] > S[0] * 0.1:
+				normal -= Vt[k] * normal.dot(Vt[k])
 
-				uvsA = vert_to_uv[vA];
-				uvsB = vert_to_uv[vB];
+	length = numpy.linalg.norm(normal)
+	if length == 0:
+		return None
+	return point, normal / length
 
-				clusters_A = collect_clusters(uvsA)
-				clusters_B = collect_clusters(uvsB)
 
-				if len(clusters_A) != len(clusters_B):
-					print("Error: Inconsistent vertex UV group pairs at vertex {} : {}".format(vA.index, vB.index))
-					continue
 
+# Pair the verts of side A with their mirror image on side B through a KD-tree of
+# side B. Closest pairs are assigned first and each vertex is used once. Verts that
+# are their own mirror image are returned as additional center verts.
+def get_mirror_pairs(co, side_A, side_B, plane, tolerance):
+	point, normal = plane
 
-				message= "...Map {0} -> {1}  = UVs {2}|{3}x | UV-Groups {4}x|{5}x".format( vA.index, vB.index, len(uvsA), len(uvsB), len(clusters_A), len(clusters_B) )
-				if len(clusters_A) > 1:
-					message = ">> "+message
-				print(message)
+	# Verts lying on the plane belong to the center
+	distance_A = (co[side_A] - point).dot(normal)
+	distance_B = (co[side_B] - point).dot(normal)
+	centers = numpy.concatenate((side_A[numpy.abs(distance_A) * 2 <= tolerance], side_B[numpy.abs(distance_B) * 2 <= tolerance]))
+	side_A = side_A[numpy.abs(distance_A) * 2 > tolerance]
+	distance_A = distance_A[numpy.abs(distance_A) * 2 > tolerance]
+	side_B = side_B[numpy.abs(distance_B) * 2 > tolerance]
 
+	if len(side_A) == 0 or len(side_B) == 0:
+		return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), centers
 
+	tree = KDTree(len(side_B))
+	for i, index in enumerate(side_B):
+		tree.insert(Vector(co[index]), i)
+	tree.balance()
 
-				if len(clusters_A) > 0:
-					# For each group
+	reflected = co[side_A] - 2 * distance_A[:, None] * normal
+	matches = []
+	for i in range(len(side_A)):
+		found, j, distance = tree.find(Vector(reflected[i]))
+		if j is not None and distance <= tolerance:
+			matches.append((distance, i, j))
 
+	pairs_A = []
+	pairs_B = []
+	used_A = set()
+	used_B = set()
+	for distance, i, j in sorted(matches):
+		if i not in used_A and j not in used_B:
+			used_A.add(i)
+			used_B.add(j)
+			pairs_A.append(side_A[i])
+			pairs_B.append(side_B[j])
 
-					
-					sortA = {}
-					sortB = {}
-					for g in range(0, len(clusters_A)):
-						uv_A = clusters_A[g][0].uv.copy()
-						uv_B = clusters_B[g][0].uv.copy()
-
-						# localize X values (from symmetry line)
-						uv_A.x = (uv_A.x - x_middle)
-						uv_B.x = (uv_B.x - x_middle)
-
-						sortA[g] = abs(uv_A.x) + uv_A.y*2.0
-						sortB[g] = abs(uv_B.x) + uv_B.y*2.0
-						# print("    .   [{}] : {:.2f}, {:.2f} | {:.2f}, {:.2f}".format(g, uv_A.x, uv_A.y, uv_B.x, uv_B.y))
-						print("    .   [{}] : {:.2f} | {:.2f}".format(g, sortA[g], sortB[g]))
-
-					# Sort sortA by value
-					sortedA = sorted(sortA.items(), key=operator.itemgetter(1))
-					sortedB = sorted(sortB.items(), key=operator.itemgetter(1))
-					
-					for g in range(0, len(clusters_A)):
-						# sortedA[g]
-						idxA = sortedA[g][0]
-						idxB = sortedB[g][0]
-
-						print("Map clusters_A {} -> ".format(idxA, idxB))
-						for uv in clusters_B[idxB]:
-							pos = clusters_A[idxA][0].uv.copy()
-							# Flip cooreindate
-							pos.x = x_middle - (pos.x-x_middle)
-							uv.uv = pos
-						
-				
-					# print("Sorted: '"+str(sortedA)+"'")
-					# print("Sorted: '"+str(sortedB)+"'")
-
-					# for item in sorted(verts_distance.items(), key=operator.itemgetter(1)):
-					# 	connected_verts[i].append( item[0] )
-
-					# TODO: Now map groups to each other
-					# uv_avg_A = Vector([0,0])
-					# uv_avg_B = Vector([0,0])
-					# for m in range(0, len(clusters_A)):
-					# 	print("        . ")
-					# 	uv_avg_A+= clusters_A[m][0].uv;
-					# 	uv_avg_B+= clusters_B[m][0].uv;
-
-					# uv_avg_A/=len(clusters_A)
-					# uv_avg_B/=len(clusters_B)
-
-					# print("        avg: {} : {}".format(uv_avg_A, uv_avg_B))
-			
-				# Done processing, add to border arrays
-				border_A.append(vA)
-				border_B.append(vB)
-
-	'''
-
-def alignToCenterLine():
-	print("align to center line")
-
-	bm = bmesh.from_edit_mesh(bpy.context.active_object.data)
-	uvLayer = bm.loops.layers.uv.verify()
-	bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='EDGE')
-
-	# 1.) Get average edges rotation + center
-	average_angle = 0
-	average_center = Vector((0,0))
-	average_count = 0
-	for face in bm.faces:
-		if face.select:
-			verts = []
-			for loop in face.loops:
-				if loop[uvLayer].select:
-					verts.append(loop[uvLayer].uv)
-
-			if len(verts) == 2:
-				diff = verts[1] - verts[0]
-				angle = math.atan2(diff.y, diff.x)%(math.pi)
-				average_center += verts[0] + diff/2
-				average_angle += angle
-				average_count+=1
-
-	if average_count >0:
-		average_angle/=average_count
-		average_center/=average_count
-
-	average_angle-= math.pi/2 #Rotate -90 degrees so aligned horizontally
-
-	# 2.) Rotate UV Shell around edge
-	bpy.context.space_data.pivot_point = 'CURSOR'
-	bpy.ops.uv.cursor_set(location=average_center)
-
-	bpy.ops.uv.select_linked(extend=False)
-	bpy.ops.transform.rotate(value=average_angle, axis=(0, 0, -1), constraint_axis=(False, False, False), constraint_orientation='GLOBAL', mirror=False, proportional='DISABLED')
-
-
-
-class UVCluster:
-	uvs = []
-	vertex = None
-	
-	def __init__(self, vertex, uvs):
-		self.vertex = vertex
-		self.uvs = uvs
-	
-	def append(self, uv):
-		self.uvs.append(uv)
+	return numpy.array(pairs_A, dtype=numpy.int64), numpy.array(pairs_B, dtype=numpy.int64), centers
+
+
+
+# Topology pairs from the cache while the mesh topology, the island and the center
+# edges are unchanged, so repeated mirrors while editing the layout skip the walk
+def get_topology_pairs_cached(obj, buffer, island, faces_island, faces_A, edges_center, edges_index):
+	key = obj.data.as_pointer()
+
+	hash_topology = hashlib.md5()
+	for array in (buffer.loop_verts, island, edges_index, numpy.array(sorted(face.index for face in faces_A), dtype=numpy.int64)):
+		hash_topology.update(numpy.ascontiguousarray(array, dtype=numpy.int64).tobytes())
+	fingerprint = (buffer.count_verts, buffer.count_faces, hash_topology.hexdigest())
+
+	entry = settings.mirror_cache.get(key)
+	if entry and entry[0] == fingerprint:
+		settings.mirror_cache.move_to_end(key)
+		return entry[1]
+
+	pairs = get_topology_pairs(faces_island, faces_A, edges_center)
+
+	settings.mirror_cache[key] = (fingerprint, pairs)
+	settings.mirror_cache.move_to_end(key)
+	while len(settings.mirror_cache) > settings.mirror_cache_size:
+		settings.mirror_cache.popitem(last=False)
+
+	return pairs
+
+
+
+# Pair the verts of both island halves by topology. The faces on either side of a
+# center edge are matched and the walk continues outward on both halves, with
+# mirrored winding. Returns (pairs_A, pairs_B, centers) vertex indices or None.
+def get_topology_pairs(faces_island, faces_A, edges_center):
+	faces_set = set(faces_island)
+	edges = set(loop.edge for loop in edges_center)
+
+	# Start at a center edge with an island face on both sides, side A first
+	start_A = None
+	for loop in edges_center:
+		other = loop.link_loop_radial_next
+		if other.face != loop.face and other.face in faces_set:
+			if len(faces_A) == 0 or loop.face in faces_A:
+				start_A, start_B = loop, other
+				break
+			elif other.face in faces_A:
+				start_A, start_B = other, loop
+				break
+	if start_A is None:
+		return None
+
+	side_A = get_faces_linked(start_A.face, faces_set, edges)
+	side_B = get_faces_linked(start_B.face, faces_set, edges)
+	if len(side_A & side_B) > 0:
+		return None
+
+	# Both start loops at the same vertex, walking side B in its own winding
+	loop_B = start_B if start_B.vert == start_A.vert else start_B.link_loop_next
+	forward = loop_B.link_loop_next.vert == start_A.link_loop_next.vert
+	pairs = utilities_uv.get_loop_correspondence(start_A, loop_B, forward, side_A, side_B)
+	if pairs is None:
+		return None
+
+	vert_pairs = {}
+	for loop_A, loop_B in pairs:
+		vert_pairs[loop_A.vert.index] = loop_B.vert.index
+
+	pairs_A = numpy.array([a for a, b in vert_pairs.items() if a != b], dtype=numpy.int64)
+	pairs_B = numpy.array([b for a, b in vert_pairs.items() if a != b], dtype=numpy.int64)
+	centers = numpy.array([a for a, b in vert_pairs.items() if a == b], dtype=numpy.int64)
+	return pairs_A, pairs_B, centers
+
+
+
+# Faces connected to face within faces_set without crossing the given edges
+def get_faces_linked(face, faces_set, edges):
+	linked = set([face])
+	stack = [face]
+	while stack:
+		for loop in stack.pop().loops:
+			if loop.edge in edges:
+				continue
+			other = loop.link_loop_radial_next.face
+			if other in faces_set and other not in linked:
+				linked.add(other)
+				stack.append(other)
+	return linked
+
+
+
+# Write the mirrored vertex UV's to the island loops. With is_average both sides get
+# the average of themselves and their mirrored partner, otherwise side A is copied to
+# side B. Stacking puts the halves on top of each other instead of flipping them.
+def apply_mirror(buffer, loops, verts, uv_verts, is_single, pairs_A, pairs_B, centers, x_middle, is_average, is_stack):
+	target = uv_verts.copy()
+	is_target = numpy.zeros(len(uv_verts), dtype=bool)
+
+	def flip(uvs):
+		if is_stack:
+			return uvs
+		uvs = uvs.copy()
+		uvs[:, 0] = 2 * x_middle - uvs[:, 0]
+		return uvs
+
+	if len(pairs_A) > 0:
+		if is_average:
+			average = (flip(uv_verts[pairs_A]) + uv_verts[pairs_B]) / 2
+			target[pairs_B] = average
+			target[pairs_A] = flip(average)
+			is_target[pairs_A] = True
+		else:
+			target[pairs_B] = flip(uv_verts[pairs_A])
+		is_target[pairs_B] = True
+
+	# Center verts snap to the symmetry line
+	if len(centers) > 0 and not is_stack:
+		target[centers, 0] = x_middle
+		is_target[centers] = True
+
+	# Verts with several UV's within the island (inner cuts) are left alone
+	is_target &= is_single
+	mask = is_target[verts]
+	buffer.uvs[loops[mask]] = target[verts[mask]]
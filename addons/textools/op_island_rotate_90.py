@@ -48,13 +48,14 @@ class op(bpy.types.Operator):
 	def execute(self, context):
 
 		main(context, self.angle)
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
 def main(context, angle):
 	
 	#Store selection
-	utilities_uv.selection_store()
+	snapshot = utilities_uv.selection_store()
 
 	bm = bmesh.from_edit_mesh(bpy.context.active_object.data)
 	uvLayer = bm.loops.layers.uv.verify()
@@ -77,4 +78,4 @@ def main(context, angle):
 
 
 	#Restore selection
-	utilities_uv.selection_restore()
\ No newline at end of file
+	utilities_uv.selection_restore(snapshot)
\ No newline at end of file
@@ -0,0 +1,175 @@
+import bpy
+import bmesh
+import numpy
+
+from . import utilities_uv
+from .utilities_buffer import UVBuffer
+
+
+class op(bpy.types.Operator):
+	bl_idname = "uv.textools_island_stack_identical"
+	bl_label = "Stack identical"
+	bl_description = "Stack all identical UV islands onto one master island each. The master is the selected island of each group, otherwise the largest one"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	allow_mirror = bpy.props.BoolProperty(name="Allow Mirror", description="Allow flipped islands to be mirrored onto the master", default=False)
+	max_candidates = bpy.props.IntProperty(name="Candidates", description="Maximum start faces tried per island to match the loops", default=16, min=1)
+	tolerance = bpy.props.FloatProperty(name="Tolerance", description="Largest RMS distance of a fit, relative to the size of the master island", default=0.01, min=0.0, precision=4)
+
+	@classmethod
+	def poll(cls, context):
+		if not bpy.context.active_object:
+			return False
+
+		if bpy.context.active_object.type != 'MESH':
+			return False
+
+		#Only in Edit mode
+		if bpy.context.active_object.mode != 'EDIT':
+			return False
+
+		#Only in UV editor mode
+		if bpy.context.area.type != 'IMAGE_EDITOR':
+			return False
+
+		##Requires UV map
+		if not bpy.context.object.data.uv_layers:
+			return False
+
+		return True
+
+
+	def execute(self, context):
+		stack(self, context)
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
+		return {'FINISHED'}
+
+
+
+def stack(self, context):
+	obj = bpy.context.active_object
+	bm = bmesh.from_edit_mesh(obj.data)
+	uvLayer = bm.loops.layers.uv.verify()
+
+	# All visible islands, without touching the selection
+	faces_visible = [face for face in bm.faces if face.select and not face.hide]
+	labels = utilities_uv.get_island_labels_cached(obj, bm, uvLayer, faces_visible)
+	islands_indices = utilities_uv.split_island_labels(labels)
+	if len(islands_indices) < 2:
+		return
+
+	islands_selected = set(labels[island[0]] for island in utilities_uv.get_selection_islands_indices(bm, uvLayer))
+
+	bm.faces.ensure_lookup_table()
+	islands = [[bm.faces[i] for i in island] for island in islands_indices]
+	groups = [group for group in utilities_uv.get_islands_by_signature(islands).values() if len(group) > 1]
+	if len(groups) == 0:
+		self.report({'INFO'}, "No identical islands found")
+		return
+
+	buffer = UVBuffer(obj)
+	bounds = utilities_uv.get_bbox_islands(buffer, islands_indices)
+
+	# Mesh loop index of each BMLoop, loops of a polygon are stored in face order
+	loop_index = {}
+	for group in groups:
+		for i in group:
+			for face in islands[i]:
+				start = buffer.face_loop_start[face.index]
+				for k, loop in enumerate(face.loops):
+					loop_index[loop] = start + k
+
+	count_stacked = 0
+	count_failed = 0
+	for group in groups:
+		# Master: a selected island of the group, otherwise the largest
+		masters = [i for i in group if labels[islands_indices[i][0]] in islands_selected]
+		if len(masters) == 0:
+			masters = [max(group, key=lambda i: bounds['area'][i])]
+		master = masters[0]
+
+		# Fits are compared against the size of the master island
+		size = numpy.hypot(bounds['width'][master], bounds['height'][master])
+		error_max = (self.tolerance * size) ** 2
+
+		labels_master = utilities_uv.get_island_face_labels_wl(islands[master])
+		counts = {}
+		for label in labels_master.values():
+			counts[label] = counts.get(label, 0) + 1
+		face_start = min(islands[master], key=lambda face: counts[labels_master[face]])
+
+		vert_labels_master = utilities_uv.get_island_vert_labels_wl(islands[master])
+		sequence_start = [vert_labels_master[loop.vert] for loop in face_start.loops]
+
+		for i in group:
+			if i == master:
+				continue
+			fit = get_island_fit(buffer, loop_index, islands[master], labels_master, face_start, sequence_start, islands[i], self.allow_mirror, self.max_candidates, error_max)
+			if fit is None or fit[3] > error_max:
+				# Mirrored or differently unwrapped islands
+				count_failed += 1
+				continue
+
+			R, center_source, center_target, error = fit
+			loops = buffer.get_face_loops(islands_indices[i])
+			buffer.uvs[loops] = (buffer.uvs[loops] - center_source).dot(R.T) + center_target
+			count_stacked += 1
+
+	# One bulk write for all islands
+	buffer.write()
+
+	if count_failed > 0:
+		self.report({'WARNING'}, "Stacked {} islands, {} could not be matched".format(count_stacked, count_failed))
+	else:
+		self.report({'INFO'}, "Stacked {} islands".format(count_stacked))
+
+
+
+# Best rigid fit of the island 'faces' onto 'faces_master'. Start faces are matched
+# by their Weisfeiler-Lehman label, 'face_start' with the rarest label of the master
+# island limits the candidates. Start loops are only walked if the vertex labels
+# around the face match 'sequence_start', the vertex labels of 'face_start'. The first
+# fit within 'error_max' is returned, otherwise the best one as (R, center_source,
+# center_target, mean squared error), or None if no loops matched.
+def get_island_fit(buffer, loop_index, faces_master, labels_master, face_start, sequence_start, faces, allow_mirror, max_candidates, error_max=0):
+	labels = utilities_uv.get_island_face_labels_wl(faces)
+	vert_labels = utilities_uv.get_island_vert_labels_wl(faces)
+
+	# Start loops and windings whose vertex labels match those of the master face
+	starts = []
+	for face in faces:
+		if labels[face] != labels_master[face_start]:
+			continue
+		sequence = [vert_labels[loop.vert] for loop in face.loops]
+		count = len(sequence)
+		starts_face = []
+		for k, loop in enumerate(face.loops):
+			for forward in (True, False):
+				step = 1 if forward else -1
+				if all(sequence[(k + step * j) % count] == sequence_start[j] for j in range(count)):
+					starts_face.append((loop, forward))
+		if len(starts_face) > 0:
+			starts.append(starts_face)
+	starts = [start for starts_face in starts[:max_candidates] for start in starts_face]
+
+	faces_master_set = set(faces_master)
+	faces_set = set(faces)
+	loop_start = face_start.loops[0]
+
+	best = None
+	best_error = numpy.inf
+	for loop, forward in starts:
+		pairs = utilities_uv.get_loop_correspondence(loop_start, loop, forward, faces_master_set, faces_set)
+		if pairs is None:
+			continue
+
+		target = buffer.uvs[[loop_index[pair[0]] for pair in pairs]].astype(numpy.float64)
+		source = buffer.uvs[[loop_index[pair[1]] for pair in pairs]].astype(numpy.float64)
+		R, center_source, center_target, error = utilities_uv.get_rigid_fit(source, target, allow_mirror)
+		if error < best_error:
+			best_error = error
+			best = (R, center_source, center_target, error)
+			if error <= error_max:
+				return best
+
+	return best
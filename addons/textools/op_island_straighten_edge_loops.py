@@ -45,6 +45,7 @@ class op(bpy.types.Operator):
 	def execute(self, context):
 
 		main(context)
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
@@ -93,7 +94,7 @@ def main(context):
 	print("Executing op_island_straighten_edge_loops")
    	
 	#Store selection
-	utilities_uv.selection_store()
+	snapshot = utilities_uv.selection_store()
 
 	bm = bmesh.from_edit_mesh(bpy.context.active_object.data)
 	uvLayer = bm.loops.layers.uv.verify()
@@ -132,5 +133,5 @@ def main(context):
 
 
 	#Restore selection
-	utilities_uv.selection_restore()
+	utilities_uv.selection_restore(snapshot)
 
@@ -7,6 +7,7 @@ from math import pi
 import time
 from math import radians, hypot
 from . import utilities_color
+from . import utilities_uv
 
 
 class op(bpy.types.Operator):
@@ -46,6 +47,7 @@ class op(bpy.types.Operator):
 
 	def execute(self, context):
 		rectify(self, context)
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
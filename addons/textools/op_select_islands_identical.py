@@ -14,6 +14,13 @@ class op(bpy.types.Operator):
 	bl_description = "Select identical UV islands with similar topology"
 	bl_options = {'REGISTER', 'UNDO'}
 
+	mode = bpy.props.EnumProperty(items= 
+		[('ACTIVE', 'Selected', 'Select islands identical to the selected island'), 
+		('ALL', 'All', 'Select every island that has an identical island')], 
+		name = "Mode", 
+		default = 'ACTIVE'
+	)
+
 	@classmethod
 	def poll(cls, context):
 		if not bpy.context.active_object:
@@ -51,22 +58,28 @@ def swap(self, context):
 	# Get selected island
 	islands = utilities_uv.getSelectionIslands()
 
-	if len(islands) != 1:
+	if self.mode == 'ACTIVE' and len(islands) != 1:
 		self.report({'ERROR_INVALID_INPUT'}, "Please select only 1 UV Island")
 		return
-	
-	island_stats_source = Island_stats(islands[0])
 
 	bpy.context.scene.tool_settings.uv_select_mode = 'FACE'
 	bpy.ops.uv.select_all(action='SELECT')
 
+	# Bucket all islands by signature in one pass
 	islands_all = utilities_uv.getSelectionIslands()
-	islands_equal = []
-	for island in islands_all:
-		island_stats = Island_stats(island)
+	groups = utilities_uv.get_islands_by_signature(islands_all)
 
-		if island_stats_source.isEqual(island_stats):
-			islands_equal.append(island_stats.faces)
+	islands_equal = []
+	if self.mode == 'ACTIVE':
+		face_source = islands[0][0]
+		for group in groups.values():
+			if any(face_source in islands_all[i] for i in group):
+				islands_equal = [islands_all[i] for i in group]
+				break
+	else:
+		for group in groups.values():
+			if len(group) > 1:
+				islands_equal.extend([islands_all[i] for i in group])
 
 	print("Islands: "+str(len(islands_equal))+"x")
 
@@ -76,49 +89,3 @@ def swap(self, context):
 			for loop in face.loops:
 				if not loop[uvLayer].select:
 					loop[uvLayer].select = True
-
-
-
-class Island_stats:
-	countFaces = 0
-	countVerts = 0
-	faces = []
-	area = 0
-	countLinkedEdges = 0
-	countLinkedFaces = 0
-	
-
-	def __init__(self, faces):
-		bm = bmesh.from_edit_mesh(bpy.context.active_object.data);
-		uvLayer = bm.loops.layers.uv.verify();
-		
-		# Collect topology stats
-		self.faces = faces
-		verts = []
-		for face in faces:
-			self.countFaces+=1
-			self.area+=face.calc_area()
-
-			for loop in face.loops:
-				if loop.vert not in verts:
-					verts.append(loop.vert)
-					self.countVerts+=1
-					self.countLinkedEdges+= len(loop.vert.link_edges)
-					self.countLinkedFaces+= len(loop.vert.link_faces)
-		
-	def isEqual(self, other):
-		if self.countVerts != other.countVerts:
-			return False
-		if self.countFaces != other.countFaces:
-			return False
-
-		if self.countLinkedEdges != other.countLinkedEdges:
-			return False
-		if self.countLinkedFaces != other.countLinkedFaces:
-			return False
-
-		# area needs to be 90%+ identical
-		if min(self.area, other.area)/max(self.area, other.area) < 0.7:
-			return False
-
-		return True
@@ -1,11 +1,11 @@
 import bpy
 import bmesh
 import operator
-from mathutils import Vector
 from collections import defaultdict
 from math import pi
 
 from . import utilities_uv
+from . import utilities_buffer
 import imp
 imp.reload(utilities_uv)
 
@@ -15,6 +15,13 @@ class op(bpy.types.Operator):
 	bl_description = "Select all overlapping UV islands"
 	bl_options = {'REGISTER', 'UNDO'}
 
+	mode = bpy.props.EnumProperty(items= 
+		[('BOUNDS', 'Bounds', 'Islands with intersecting bounding boxes'), 
+		('EXACT', 'Exact', 'Faces whose UV triangles intersect faces of other islands')], 
+		name = "Mode", 
+		default = 'BOUNDS'
+	)
+
 	@classmethod
 	def poll(cls, context):
 		if not bpy.context.active_object:
@@ -44,12 +51,12 @@ class op(bpy.types.Operator):
 
 	def execute(self, context):
 		
-		selectOverlap(context)
+		selectOverlap(self, context, self.mode)
 		return {'FINISHED'}
 
 
 
-def selectOverlap(context):
+def selectOverlap(self, context, mode='BOUNDS'):
 	print("Execute op_select_islands_overlap")
 
 	# https://developer.blender.org/D2865
@@ -60,79 +67,53 @@ def selectOverlap(context):
 	bpy.context.scene.tool_settings.uv_select_mode = 'FACE'
 	bpy.ops.uv.select_all(action='SELECT')
 
-	islands_all = utilities_uv.getSelectionIslands()
+	islands_all = utilities_uv.get_selection_islands_indices(bm, uvLayer)
 	# count = len(islands_all)
 
-	islands_bounds = []
-	for island in islands_all:
-		islands_bounds.append( Island_bounds( island ) )
-	
+	buffer = utilities_buffer.UVBuffer(bpy.context.active_object)
+
+	if mode == 'EXACT':
+		# Triangle level overlap, select only the overlapping faces
+		faces, area = utilities_uv.get_islands_overlap_exact(buffer, islands_all)
+
+		bpy.ops.uv.select_all(action='DESELECT')
+		bm.faces.ensure_lookup_table()
+		utilities_uv.setSelectedFaces( [bm.faces[index] for index in faces] )
+
+		self.report({'INFO'}, "{}x overlapping faces, overlap area {:.2f}% of UV space".format(len(faces), area * 100))
+		return
+
+	# Bounds of all islands in one pass
+	bounds = utilities_uv.get_bbox_islands(buffer, islands_all)
+
+	# Broad phase: only pairs with intersecting bounds
+	pairs_A, pairs_B = utilities_uv.get_bbox_overlap_pairs(bounds['min'], bounds['max'])
+
+	neighbours = [[] for island in islands_all]
+	for A, B in zip(pairs_A.tolist(), pairs_B.tolist()):
+		neighbours[A].append(B)
+		neighbours[B].append(A)
 
 	groups = []
-	unmatched = islands_bounds.copy()
+	matched = bytearray(len(islands_all))
 
-	for islandA in islands_bounds:
-		if islandA in unmatched:
+	for A in range(len(islands_all)):
+		if not matched[A]:
 
-			group = [islandA]
-			for islandB in unmatched:
-				if islandA != islandB and islandA.isEqual(islandB):
-					group.append(islandB)
+			group = [A] + [B for B in sorted(neighbours[A]) if not matched[B]]
 
 			for item in group:
-				unmatched.remove(item)
+				matched[item] = 1
 
 			groups.append(group)
 
-			print("Group: {} islands, unmatched: {}x".format(len(group), len(unmatched)))
-		# groups.append(  )
-
 
 	bpy.ops.uv.select_all(action='DESELECT')
+	bm.faces.ensure_lookup_table()
 	for group in groups:
 		if len(group) > 1:
 			for i in range(1, len(group)):
-				utilities_uv.setSelectedFaces( group[i].faces )
+				utilities_uv.setSelectedFaces( [bm.faces[index] for index in islands_all[group[i]]] )
 
 
 	print("Groups: "+str(len(groups)))
-
-
-
-
-class Island_bounds:
-	faces = []
-	center = Vector([0,0])
-	min = Vector([0,0])
-	max = Vector([0,0])
-
-	def __init__(self, faces):
-		bm = bmesh.from_edit_mesh(bpy.context.active_object.data);
-		uvLayer = bm.loops.layers.uv.verify();
-		
-		# Collect topology stats
-		self.faces = faces
-
-		#Select Island
-		bpy.ops.uv.select_all(action='DESELECT')
-		utilities_uv.setSelectedFaces(faces)
-
-		bounds = utilities_uv.getSelectionBBox()
-		self.center = bounds['center']
-		self.min = bounds['min']
-		self.max = bounds['max']
-
-
-		
-	def isEqual(A, B):
-
-		# Bounding Box AABB intersection?
-		min_x = max(A.min.x, B.min.x)
-		min_y = max(A.min.y, B.min.y)
-		max_x = min(A.max.x, B.max.x)
-		max_y = min(A.max.y, B.max.y)
-		if not (max_x < min_x or max_y < min_y):
-			return True
-		
-
-		return False
\ No newline at end of file
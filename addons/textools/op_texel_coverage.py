@@ -0,0 +1,76 @@
+import bpy
+import numpy
+
+from . import utilities_texel
+from . import utilities_buffer
+
+
+class op(bpy.types.Operator):
+	bl_idname = "uv.textools_texel_coverage"
+	bl_label = "UV Coverage"
+	bl_description = "Count empty, single and overlapping texels of the selected UV's at texture size"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	use_image = bpy.props.BoolProperty(name="Debug Image", description="Write the coverage into an image: empty black, single green, overlap red", default=False)
+
+	@classmethod
+	def poll(cls, context):
+		#Only in UV editor mode
+		if bpy.context.area.type != 'IMAGE_EDITOR':
+			return False
+
+		if not bpy.context.active_object:
+			return False
+
+		if len(bpy.context.selected_objects) == 0:
+			return False
+
+		if bpy.context.active_object.type != 'MESH':
+			return False
+
+		#Requires UV map
+		if not bpy.context.object.data.uv_layers:
+			return False
+
+		return True
+
+	def execute(self, context):
+		coverage(
+			self, 
+			context,
+			bpy.context.scene.texToolsSettings.size[0], 
+			bpy.context.scene.texToolsSettings.size[1],
+			self.use_image
+		)
+		return {'FINISHED'}
+
+
+
+def coverage(self, context, size_x, size_y, use_image):
+	# Collect UV triangles of all selected objects, or selected faces in edit mode
+	tris_uv = []
+	for obj in bpy.context.selected_objects:
+		if obj.type == 'MESH' and obj.data.uv_layers:
+			buffer = utilities_buffer.UVBuffer(obj)
+			tri_loops, tri_faces = buffer.get_triangles()
+			if obj.mode == 'EDIT':
+				tri_loops = tri_loops[buffer.face_select[tri_faces]]
+			tris_uv.append(buffer.uvs[tri_loops])
+
+	if len(tris_uv) == 0:
+		self.report({'ERROR_INVALID_INPUT'}, "No valid meshes or UV maps" )
+		return
+
+	result = utilities_texel.get_uv_coverage(numpy.concatenate(tris_uv), size_x, size_y, keep_buffer=use_image)
+
+	if use_image:
+		image = utilities_texel.coverage_image("TT_coverage", result['buffer'])
+		for area in bpy.context.screen.areas:
+			if area.type == 'IMAGE_EDITOR':
+				area.spaces[0].image = image
+
+	self.report({'INFO'}, "Wasted {:.1f}%, {}x overlapping texels ({:.1f}%)".format(
+		result['wasted'], 
+		result['overlap'], 
+		100.0 * result['overlap'] / result['total']
+	))
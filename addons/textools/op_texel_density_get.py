@@ -1,9 +1,9 @@
 import bpy
-import bmesh
 import operator
-import math
+import numpy
 
 from . import utilities_texel
+from .utilities_buffer import UVBuffer
 
 
 class op(bpy.types.Operator):
@@ -49,7 +49,6 @@ class op(bpy.types.Operator):
 def get_texel_density(self, context):
 	print("Get texel density")
 
-	edit_mode = bpy.context.object.mode == 'EDIT'
 	object_faces = utilities_texel.get_selected_object_faces()
 
 	# Warning: No valid input objects
@@ -72,52 +71,16 @@ def get_texel_density(self, context):
 	sum_area_vt = 0
 	sum_area_uv = 0
 
-	# Get area for each triangle in view and UV
+	# Face areas in world and texture space, all faces of an object at once
 	for obj in object_faces:
-		bpy.ops.object.mode_set(mode='OBJECT')
-		bpy.ops.object.select_all(action='DESELECT')
-		bpy.context.scene.objects.active = obj
-		obj.select = True
-
-		# Find image of object
-		image = object_images[obj]
+		image = object_images.get(obj)
 		if image:
-			bpy.ops.object.mode_set(mode='EDIT')
-			bm = bmesh.from_edit_mesh(obj.data)
-			uvLayer = bm.loops.layers.uv.verify()
-			bm.faces.ensure_lookup_table()
-			
-			for index in object_faces[obj]:
-				face = bm.faces[index]
-
-				# Triangle Verts
-				triangle_uv = [loop[uvLayer].uv for loop in face.loops ]
-				triangle_vt = [vert.co for vert in face.verts]
-
-				#Triangle Areas
-				face_area_vt = utilities_texel.get_area_triangle(
-					triangle_vt[0], 
-					triangle_vt[1], 
-					triangle_vt[2] 
-				)
-				face_area_uv = utilities_texel.get_area_triangle_uv(
-					triangle_uv[0], 
-					triangle_uv[1], 
-					triangle_uv[2],
-					image.size[0],
-					image.size[1]
-				)
-				sum_area_vt+= math.sqrt( face_area_vt )
-				sum_area_uv+= math.sqrt( face_area_uv ) * min(image.size[0], image.size[1])
-
-	# Restore selection
-	bpy.ops.object.mode_set(mode='OBJECT')
-	bpy.ops.object.select_all(action='DESELECT')
-	for obj in object_faces:
-		obj.select = True
-	bpy.context.scene.objects.active = list(object_faces.keys())[0]
-	if edit_mode:
-		bpy.ops.object.mode_set(mode='EDIT')
+			buffer = UVBuffer(obj)
+			area_vt, area_uv = utilities_texel.get_face_areas(obj, buffer, image.size[0], image.size[1])
+
+			faces = object_faces[obj]
+			sum_area_vt+= numpy.sqrt(area_vt[faces]).sum()
+			sum_area_uv+= numpy.sqrt(area_uv[faces]).sum()
 
 	# print("Sum verts area {}".format(sum_area_vt))
 	# print("Sum texture area {}".format(sum_area_uv))
@@ -126,4 +89,3 @@ def get_texel_density(self, context):
 		bpy.context.scene.texToolsSettings.texel_density = 0
 	else:
 		bpy.context.scene.texToolsSettings.texel_density = sum_area_uv / sum_area_vt
-	
\ No newline at end of file
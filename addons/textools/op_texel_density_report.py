@@ -0,0 +1,145 @@
+import bpy
+import numpy
+
+from . import settings
+from . import utilities_texel
+from .utilities_buffer import UVBuffer
+
+
+heatmap_name = "TT_texel_density"
+
+
+class op(bpy.types.Operator):
+	bl_idname = "uv.textools_texel_density_report"
+	bl_label = "Texel Report"
+	bl_description = "Texel density of every mesh in the scene, as a summary per object and a vertex color heatmap relative to the texel density"
+	bl_options = {'REGISTER', 'UNDO'}
+
+	use_heatmap = bpy.props.BoolProperty(name="Heatmap", description="Write the density into the '"+heatmap_name+"' vertex colors: blue too low, green on target, red too high", default=True)
+	outlier_factor = bpy.props.FloatProperty(name="Outlier Factor", description="Faces this many times above or below the target density are outliers", default=2.0, min=1.0)
+	sort = bpy.props.EnumProperty(items=
+		[('OUTLIERS', 'Outliers', 'Most outlier faces first'),
+		('MEDIAN', 'Median', 'Highest median density first'),
+		('MIN', 'Min', 'Lowest density first'),
+		('MAX', 'Max', 'Highest density first'),
+		('NAME', 'Name', 'By object name')],
+		name = "Sort",
+		default = 'OUTLIERS'
+	)
+
+	@classmethod
+	def poll(cls, context):
+		for obj in bpy.context.scene.objects:
+			if obj.type == 'MESH' and obj.data.uv_layers:
+				return True
+		return False
+
+	def execute(self, context):
+		report(
+			self,
+			context,
+			bpy.context.scene.texToolsSettings.texel_density,
+			self.use_heatmap,
+			self.outlier_factor,
+			self.sort
+		)
+		return {'FINISHED'}
+
+
+
+def report(self, context, target, use_heatmap, outlier_factor, sort):
+	size_default = bpy.context.scene.texToolsSettings.size
+
+	# Analyse one object at a time, only the face densities are kept
+	objects = []
+	for obj in bpy.context.scene.objects:
+		if obj.type != 'MESH' or not obj.data.uv_layers or len(obj.data.polygons) == 0:
+			continue
+
+		image = utilities_texel.get_object_texture_image(obj)
+		if image and image.size[0] > 0 and image.size[1] > 0:
+			size_x, size_y = image.size[0], image.size[1]
+		else:
+			size_x, size_y = size_default[0], size_default[1]
+
+		buffer = UVBuffer(obj)
+		area_vt, area_uv = utilities_texel.get_face_areas(obj, buffer, size_x, size_y)
+		density = utilities_texel.get_texel_density_faces(area_vt, area_uv).astype(numpy.float32)
+
+		objects.append((obj, density, buffer.face_loop_total, utilities_texel.get_texel_density(area_vt, area_uv)))
+
+	densities = numpy.zeros(0)
+	if len(objects) > 0:
+		densities = numpy.concatenate([density[density > 0] for obj, density, loop_total, density_object in objects])
+	if len(densities) == 0:
+		self.report({'ERROR_INVALID_INPUT'}, "No faces with UV's found" )
+		return
+
+	# Without a texel density set, compare against the scene median
+	if target <= 0:
+		target = float(numpy.median(densities))
+
+	rows = []
+	for obj, density, loop_total, density_object in objects:
+		valid = density > 0
+		ratio = density[valid] / target
+		outliers = numpy.flatnonzero(valid)[(ratio > outlier_factor) | (ratio < 1.0 / outlier_factor)]
+
+		row = {
+			'object': obj.name,
+			'faces': len(density),
+			'density': density_object,
+			'min': float(density[valid].min()) if valid.any() else 0,
+			'max': float(density[valid].max()) if valid.any() else 0,
+			'median': float(numpy.median(density[valid])) if valid.any() else 0,
+			'outliers': len(outliers),
+			'outlier_faces': outliers
+		}
+		rows.append(row)
+
+		if use_heatmap:
+			colors = utilities_texel.get_heatmap_colors(density, target, max(numpy.log2(outlier_factor), 0.1))
+			write_heatmap(obj, numpy.repeat(colors, loop_total, axis=0))
+
+	if sort == 'NAME':
+		rows.sort(key=lambda row: row['object'])
+	elif sort == 'MIN':
+		rows.sort(key=lambda row: row['min'])
+	else:
+		rows.sort(key=lambda row: row[sort.lower()], reverse=True)
+	settings.texel_report = rows
+
+	print("Texel density report, target {:.2f}".format(target))
+	for row in rows:
+		print("  {:<32} {:>8} faces  density {:>9.2f}  min {:>9.2f}  median {:>9.2f}  max {:>9.2f}  {} outliers".format(
+			row['object'], row['faces'], row['density'], row['min'], row['median'], row['max'], row['outliers']
+		))
+
+	count_outliers = sum(row['outliers'] for row in rows)
+	self.report({'INFO'}, "{} objects, density {:.1f} - {:.1f}, median {:.1f}, {} outlier faces".format(
+		len(rows),
+		densities.min(),
+		densities.max(),
+		numpy.median(densities),
+		count_outliers
+	))
+
+
+
+# Write per loop colors into the heatmap vertex color layer of an object
+def write_heatmap(obj, colors):
+	is_edit = obj.mode == 'EDIT'
+	if is_edit:
+		bpy.ops.object.mode_set(mode='OBJECT')
+
+	mesh = obj.data
+	layer = mesh.vertex_colors.get(heatmap_name)
+	if layer is None:
+		layer = mesh.vertex_colors.new(name=heatmap_name)
+	mesh.vertex_colors.active = layer
+
+	layer.data.foreach_set('color', numpy.ascontiguousarray(colors, dtype=numpy.float32).ravel())
+	mesh.update()
+
+	if is_edit:
+		bpy.ops.object.mode_set(mode='EDIT')
@@ -1,13 +1,14 @@
 import bpy
 import bmesh
 import operator
-import math
+import numpy
 from mathutils import Vector
 from collections import defaultdict
 
 
 from . import utilities_texel
 from . import utilities_uv
+from .utilities_buffer import UVBuffer
 
 class op(bpy.types.Operator):
 	bl_idname = "uv.textools_texel_density_set"
@@ -50,6 +51,7 @@ class op(bpy.types.Operator):
 			bpy.context.scene.texToolsSettings.texel_mode_scale,
 			bpy.context.scene.texToolsSettings.texel_density
 		)
+		utilities_uv.island_cache_invalidate()
 		return {'FINISHED'}
 
 
@@ -81,97 +83,64 @@ def set_texel_density(self, context, mode, density):
 
 
 	for obj in object_faces:
-		bpy.ops.object.mode_set(mode='OBJECT')
-		bpy.ops.object.select_all(action='DESELECT')
-		bpy.context.scene.objects.active = obj
-		obj.select = True
-
-		# Find image of object
-		image = object_images[obj]
+		image = object_images.get(obj)
 		if image:
-			bpy.ops.object.mode_set(mode='EDIT')
-
-			# Store selection
-			utilities_uv.selection_store()
-
-			bm = bmesh.from_edit_mesh(obj.data)
-			uvLayer = bm.loops.layers.uv.verify()
-
-			# Collect groups of faces to scale together
-			group_faces = []
-			if mode == 'EDIT':
-				# Scale selected faces
-				bm.faces.ensure_lookup_table()
-				group_faces = [[ bm.faces[index] ] for index in object_faces[obj] ]
-
-			elif mode == 'ALL':
-				# Scale all UV's together
-				group_faces = [bm.faces]
-
-			elif mode == 'ISLAND':
-				# Scale each UV idland centered
-				bpy.ops.mesh.select_all(action='SELECT')
-				bpy.ops.uv.select_all(action='SELECT')
-				group_faces = utilities_uv.getSelectionIslands()
-
-			print("group_faces {}x".format(len(group_faces)))
-
-
-			for group in group_faces:
-				# Get triangle areas
-				sum_area_vt = 0
-				sum_area_uv = 0
-				for face in group:
-					# Triangle Verts
-					triangle_uv = [loop[uvLayer].uv for loop in face.loops ]
-					triangle_vt = [obj.matrix_world * vert.co for vert in face.verts]
-
-					#Triangle Areas
-					face_area_vt = utilities_texel.get_area_triangle(
-						triangle_vt[0], 
-						triangle_vt[1], 
-						triangle_vt[2] 
-					)
-					face_area_uv = utilities_texel.get_area_triangle_uv(
-						triangle_uv[0], 
-						triangle_uv[1], 
-						triangle_uv[2],
-						image.size[0],
-						image.size[1]
-					)
-					
-					sum_area_vt+= math.sqrt( face_area_vt )
-					sum_area_uv+= math.sqrt( face_area_uv ) * min(image.size[0], image.size[1])
-
-				# Apply scale to group
-				scale = density / (sum_area_uv / sum_area_vt)
-
-				# Set Scale Origin to Island or top left
-				if mode == 'EDIT' or mode == 'ISLAND':
-					bpy.context.space_data.pivot_point = 'MEDIAN'
-				elif mode == 'ALL':
-					bpy.context.space_data.pivot_point = 'CURSOR'
-					bpy.ops.uv.cursor_set(location=(0, 1))
-
-				# Select Face loops and scale
-				bpy.ops.uv.select_all(action='DESELECT')
-				bpy.context.scene.tool_settings.uv_select_mode = 'VERTEX'
-				for face in group:
-					for loop in face.loops:
-						loop[uvLayer].select = True
-
-				print("Scale: {} {}x".format(scale, len(group)))
-				bpy.ops.transform.resize(value=(scale, scale, 1), proportional='DISABLED')
-
-			# Restore selection
-			utilities_uv.selection_restore()
-
-
-	# Restore selection
-	bpy.ops.object.mode_set(mode='OBJECT')
-	bpy.ops.object.select_all(action='DESELECT')
-	for obj in object_faces:
-		obj.select = True
-	bpy.context.scene.objects.active = list(object_faces.keys())[0]
+			set_texel_density_object(obj, image, mode, density, object_faces[obj])
+
+
+
+# Scale the groups of one object arithmetically on its UV buffer and write the
+# UV's back once. No mode switches, selection changes or transform operators.
+def set_texel_density_object(obj, image, mode, density, faces):
+	buffer = UVBuffer(obj)
+	area_vt, area_uv = utilities_texel.get_face_areas(obj, buffer, image.size[0], image.size[1])
+
 	if mode == 'EDIT':
-		bpy.ops.object.mode_set(mode='EDIT')
\ No newline at end of file
+		# Scale each selected face around its median, like a resize of only its loops
+		groups = [[index] for index in faces]
+		pivot = None
+
+	elif mode == 'ISLAND':
+		# Scale each UV island centered, islands from a temporary bmesh
+		bm = bmesh.new()
+		bm.from_mesh(obj.data)
+		uvLayer = bm.loops.layers.uv.verify()
+		groups = utilities_uv.split_island_labels(utilities_uv.get_island_labels(bm, uvLayer))
+		bm.free()
+		pivot = None
+
+	else:
+		# Scale all UV's together around the cursor at the top left
+		groups = [numpy.arange(buffer.count_faces)]
+		pivot = (0, 1)
+
+	print("groups {}x".format(len(groups)))
+
+	group_density = utilities_texel.get_texel_density_islands(area_vt, area_uv, groups)
+	scales = numpy.ones(len(groups))
+	scales[group_density > 0] = density / group_density[group_density > 0]
+
+	scale_uv_groups(buffer, groups, scales, pivot)
+	buffer.write()
+
+
+
+# Scale the UV's of groups of faces (face index arrays) by one factor per group,
+# around the median of each group or around a shared pivot point
+def scale_uv_groups(buffer, groups, scales, pivot=None):
+	face_labels = utilities_uv.get_island_face_labels(buffer.count_faces, groups)
+	loop_labels = buffer.get_loop_labels(face_labels)
+	loops = numpy.flatnonzero(loop_labels >= 0)
+	labels = loop_labels[loops]
+
+	uvs = buffer.uvs[loops].astype(numpy.float64)
+	if pivot is None:
+		counts = numpy.maximum(numpy.bincount(labels, minlength=len(groups)), 1)
+		centers = numpy.column_stack([
+			numpy.bincount(labels, weights=uvs[:, i], minlength=len(groups)) / counts for i in range(2)
+		])
+		centers = centers[labels]
+	else:
+		centers = numpy.asarray(pivot, dtype=numpy.float64)
+
+	buffer.uvs[loops] = (uvs - centers) * numpy.asarray(scales)[labels][:, None] + centers
@@ -44,15 +44,13 @@ class op(bpy.types.Operator):
 
 	def execute(self, context):
 		main(context)
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
 def main(context):
 	print("operatyor_faces_iron()")
 
-	#Store selection
-	utilities_uv.selection_store()
-
 	bm = bmesh.from_edit_mesh(bpy.context.active_object.data)
 	uvLayer = bm.loops.layers.uv.verify()
 
@@ -34,6 +34,7 @@ class op(bpy.types.Operator):
 
 	def execute(self, context):
 		unwrap_edges_pipe(self, context)
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
@@ -38,6 +38,7 @@ class op(bpy.types.Operator):
 	
 	def execute(self, context):
 		crop(self, context)
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
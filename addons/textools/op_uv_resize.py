@@ -155,7 +155,7 @@ class op(bpy.types.Operator):
 
 
 		#Store selection
-		utilities_uv.selection_store()
+		snapshot = utilities_uv.selection_store()
 
 		# Get start and end size
 		size_A = Vector([ 
@@ -186,8 +186,9 @@ class op(bpy.types.Operator):
 
 
 		#Restore selection
-		utilities_uv.selection_restore()
+		utilities_uv.selection_restore(snapshot)
 
+		utilities_uv.island_cache_invalidate(bpy.context.active_object)
 		return {'FINISHED'}
 
 
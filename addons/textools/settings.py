@@ -1,20 +1,24 @@
 import bpy
 import bmesh
 import operator
+from collections import OrderedDict
 
-selection_uv_mode = '';
-selection_uv_loops = []
-selection_uv_pivot = '';
-selection_uv_pivot_pos = (0,0)
+island_cache = OrderedDict()
+island_cache_size = 8
+island_cache_counter = 0
 
-selection_mode = [False, False, True];
-selection_vert_indexies = []
-selection_face_indexies = []
+mirror_cache = OrderedDict()
+mirror_cache_size = 8
+
+texel_report = []
 
 bake_mode = 'UNDEFINED'
 bake_render_engine = ''
 bake_objects_hide_render = [] 
 sets = []
+sets_cached = []
+sets_fingerprint = None
+bake_job = None
 
 checker_map_modes = ['UV_GRID','COLOR_GRID']
 checker_map_index = 0;
@@ -2,11 +2,15 @@ import bpy
 import bmesh
 import operator
 import time
+import hashlib
+import numpy
 from mathutils import Vector
+from mathutils import Color
 from collections import defaultdict
 from math import pi
 
 from . import settings
+from .utilities_buffer import foreach_get
 
 
 keywords_low = ['lowpoly','low','lowp','lp','l']
@@ -28,7 +32,7 @@ class BakeMode:
 		self.material = material
 		self.type = type
 		self.normal_space = normal_space
-		self.setVertexColor = None
+		self.setVertexColor = setVertexColor
 		self.color = color
 
 
@@ -156,63 +160,106 @@ def get_object_type(obj):
 
 
 
+# Content hash of everything the texture of a bake set depends on: mesh data,
+# modifiers, materials and world matrix of each object plus the bake parameters.
+# Materials assigned by the bake itself are left out.
+def get_bake_set_hash(set, parameters, materials_ignored=[]):
+	md5 = hashlib.md5(repr(sorted(parameters.items())).encode())
+	for type, objects in [('low', set.objects_low), ('high', set.objects_high), ('cage', set.objects_cage), ('float', set.objects_float)]:
+		for obj in objects:
+			md5.update("{} {}".format(type, obj.name).encode())
+			update_hash_object(md5, obj, materials_ignored)
+	return md5.hexdigest()
+
+
+
+def update_hash_object(md5, obj, materials_ignored=[]):
+	mesh = obj.data
+	count_loops = len(mesh.loops)
+	count_faces = len(mesh.polygons)
+
+	md5.update(foreach_get(mesh.vertices, 'co', len(mesh.vertices), 3).tobytes())
+	md5.update(foreach_get(mesh.loops, 'vertex_index', count_loops, 1, numpy.int32).tobytes())
+	md5.update(foreach_get(mesh.polygons, 'loop_total', count_faces, 1, numpy.int32).tobytes())
+	md5.update(foreach_get(mesh.polygons, 'use_smooth', count_faces, 1, bool).tobytes())
+	md5.update(foreach_get(mesh.edges, 'use_edge_sharp', len(mesh.edges), 1, bool).tobytes())
+	for uv_layer in mesh.uv_layers:
+		md5.update(uv_layer.name.encode())
+		md5.update(foreach_get(uv_layer.data, 'uv', count_loops, 2).tobytes())
+
+	md5.update(numpy.array(obj.matrix_world, dtype=numpy.float64).tobytes())
+	md5.update(repr((mesh.use_auto_smooth, mesh.auto_smooth_angle)).encode())
+	md5.update(repr([slot.material.name for slot in obj.material_slots if slot.material and slot.material.name not in materials_ignored]).encode())
+	for modifier in obj.modifiers:
+		md5.update(repr(get_rna_values(modifier)).encode())
+
+
+
+# Values of all properties of a struct, ID pointers by name
+def get_rna_values(struct):
+	values = []
+	for prop in struct.bl_rna.properties:
+		if prop.identifier == 'rna_type' or prop.type == 'COLLECTION':
+			continue
+		value = getattr(struct, prop.identifier, None)
+		if prop.type == 'POINTER':
+			value = value.name if isinstance(value, bpy.types.ID) else None
+		elif getattr(prop, 'array_length', 0) > 0:
+			value = tuple(value)
+		elif isinstance(value, set):
+			value = sorted(value)
+		values.append((prop.identifier, value))
+	return values
+
+
+
+# Bake sets of the selection, rebuilt only when the fingerprint of the selected
+# objects changes. Panels call this on every redraw.
+def get_bake_sets_cached():
+	fingerprint = get_bake_sets_fingerprint()
+	if fingerprint != settings.sets_fingerprint:
+		settings.sets_fingerprint = fingerprint
+		settings.sets_cached = get_bake_sets()
+	return settings.sets_cached
+
+
+
+# Everything the bake sets depend on: the selected meshes, their names, the
+# modifiers used for type detection and whether they have UV maps
+def get_bake_sets_fingerprint():
+	return tuple(
+		(obj.as_pointer(), obj.name, tuple(modifier.type for modifier in obj.modifiers), len(obj.data.uv_layers))
+		for obj in bpy.context.selected_objects if obj.type == 'MESH'
+	)
+
+
+
 def get_bake_sets():
-	filtered = {}
+	# Group by names, one lookup per object
+	groups = defaultdict(list)
+	types = {}
 	for obj in bpy.context.selected_objects:
 		if obj.type == 'MESH':
-			filtered[obj] = get_object_type(obj)
-	
-	groups = []
-	# Group by names
-	for key in filtered:
-		name = get_bake_name(key.name)
-
-		if len(groups)==0:
-			groups.append([key])
-		else:
-			isFound = False
-			for group in groups:
-				groupName = get_bake_name(group[0].name)
-				if name == groupName:
-					group.append(key)
-					isFound = True
-					break
-
-			if not isFound:
-				groups.append([key])
+			types[obj] = get_object_type(obj)
+			groups[get_bake_name(obj.name)].append(obj)
 
 	# Sort groups alphabetically
-	keys = [get_bake_name(group[0].name) for group in groups]
-	keys.sort()
-	sorted_groups = []
-	for key in keys:
-		for group in groups:
-			if key == get_bake_name(group[0].name):
-				sorted_groups.append(group)
-				break
-				
-	groups = sorted_groups			
-	# print("Keys: "+", ".join(keys))
-
-
 	bake_sets = []
-	for group in groups:
+	for name in sorted(groups.keys()):
 		low = []
 		high = []
 		cage = []
 		float = []
-		for obj in group:
-			if filtered[obj] == 'low':
+		for obj in groups[name]:
+			if types[obj] == 'low':
 				low.append(obj)
-			elif filtered[obj] == 'high':
+			elif types[obj] == 'high':
 				high.append(obj)
-			elif filtered[obj] == 'cage':
+			elif types[obj] == 'cage':
 				cage.append(obj)
-			elif filtered[obj] == 'float':
+			elif types[obj] == 'float':
 				float.append(obj)
 
-
-		name = get_bake_name(group[0].name)
 		bake_sets.append(BakeSet(name, low, cage, high, float))
 
 	return bake_sets
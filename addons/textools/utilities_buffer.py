@@ -0,0 +1,139 @@
+import bmesh
+import numpy
+
+
+# Bulk access to the UV's and loop topology of a mesh as contiguous numpy arrays.
+# Each attribute is read with a single foreach_get and written back with foreach_set
+# instead of walking bm.faces and face.loops in python.
+#
+# In edit mode the edit-mesh is synced into the mesh data before reading. Writing
+# in edit mode only sets the loops that changed since reading through the edit
+# bmesh, so bmesh references of the caller stay valid.
+class UVBuffer:
+	obj = None
+	mesh = None
+	uv_layer_name = ""
+
+	count_loops = 0
+	count_faces = 0
+	count_verts = 0
+
+	uvs = None				# (loops, 2) float32
+	select = None			# (loops) bool, UV loop selection
+	uvs_written = None		# (loops, 2) float32, UV's as on the mesh
+	select_written = None	# (loops) bool
+	loop_verts = None		# (loops) int32, loop -> vertex index
+	loop_faces = None		# (loops) int32, loop -> face index
+	face_loop_start = None	# (faces) int32
+	face_loop_total = None	# (faces) int32
+	face_select = None		# (faces) bool
+	face_hide = None		# (faces) bool
+
+	def __init__(self, obj, uv_layer=None):
+		self.obj = obj
+		self.mesh = obj.data
+
+		if obj.mode == 'EDIT':
+			obj.update_from_editmode()
+
+		mesh = self.mesh
+		if uv_layer is None:
+			uv_layer = mesh.uv_layers.active
+		self.uv_layer_name = uv_layer.name
+
+		self.count_loops = len(mesh.loops)
+		self.count_faces = len(mesh.polygons)
+		self.count_verts = len(mesh.vertices)
+
+		self.uvs = foreach_get(uv_layer.data, 'uv', self.count_loops, 2, numpy.float32)
+		self.select = foreach_get(uv_layer.data, 'select', self.count_loops, 1, bool)
+		self.uvs_written = self.uvs.copy()
+		self.select_written = self.select.copy()
+		self.loop_verts = foreach_get(mesh.loops, 'vertex_index', self.count_loops, 1, numpy.int32)
+
+		self.face_loop_start = foreach_get(mesh.polygons, 'loop_start', self.count_faces, 1, numpy.int32)
+		self.face_loop_total = foreach_get(mesh.polygons, 'loop_total', self.count_faces, 1, numpy.int32)
+		self.face_select = foreach_get(mesh.polygons, 'select', self.count_faces, 1, bool)
+		self.face_hide = foreach_get(mesh.polygons, 'hide', self.count_faces, 1, bool)
+
+		# Polygon loops are stored consecutively, in face order
+		self.loop_faces = numpy.repeat(
+			numpy.arange(self.count_faces, dtype=numpy.int32),
+			self.face_loop_total
+		)
+
+
+	# Loop indices of the given face indices
+	def get_face_loops(self, faces):
+		face_mask = numpy.zeros(self.count_faces, dtype=bool)
+		face_mask[faces] = True
+		return numpy.flatnonzero(face_mask[self.loop_faces])
+
+
+	# Expand a per face label array to a per loop label array
+	def get_loop_labels(self, face_labels):
+		return face_labels[self.loop_faces]
+
+
+	# Fan triangulation of all faces: (tris, 3) loop indices and (tris) face indices
+	def get_triangles(self):
+		counts = numpy.maximum(self.face_loop_total - 2, 0)
+		tri_faces = numpy.repeat(numpy.arange(self.count_faces, dtype=numpy.int32), counts)
+		fan = numpy.arange(len(tri_faces)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+		start = self.face_loop_start[tri_faces]
+
+		tri_loops = numpy.column_stack((start, start + fan + 1, start + fan + 2)).astype(numpy.int32)
+		return tri_loops, tri_faces
+
+
+	# Write the UV's (and optionally the UV selection) back to the mesh
+	def write(self, select=False):
+		if self.obj.mode == 'EDIT':
+			self.write_edit_mesh(select)
+		else:
+			uv_layer = self.mesh.uv_layers[self.uv_layer_name]
+			uv_layer.data.foreach_set('uv', numpy.ascontiguousarray(self.uvs, dtype=numpy.float32).ravel())
+			if select:
+				uv_layer.data.foreach_set('select', self.select)
+			self.mesh.update()
+
+		self.uvs_written = self.uvs.copy()
+		if select:
+			self.select_written = self.select.copy()
+
+
+	# Set the changed loops on the edit bmesh, addressed by face index and position
+	# in the face since mesh loops are stored in face order
+	def write_edit_mesh(self, select):
+		changed = numpy.any(self.uvs != self.uvs_written, axis=1)
+		if select:
+			changed |= self.select != self.select_written
+		loops = numpy.flatnonzero(changed)
+		if len(loops) == 0:
+			return
+
+		bm = bmesh.from_edit_mesh(self.mesh)
+		uv_layer = bm.loops.layers.uv.get(self.uv_layer_name)
+		bm.faces.ensure_lookup_table()
+
+		faces = self.loop_faces[loops]
+		positions = (loops - self.face_loop_start[faces]).tolist()
+		uvs = self.uvs[loops].tolist()
+		selects = self.select[loops].tolist()
+		for face, position, uv, is_selected in zip(faces.tolist(), positions, uvs, selects):
+			loop_uv = bm.faces[face].loops[position][uv_layer]
+			loop_uv.uv = uv
+			if select:
+				loop_uv.select = is_selected
+
+		bmesh.update_edit_mesh(self.mesh)
+
+
+
+# Read an attribute of a bpy collection into a numpy array
+def foreach_get(collection, attribute, count, size=1, dtype=numpy.float32):
+	buffer = numpy.empty(count * size, dtype=dtype)
+	collection.foreach_get(attribute, buffer)
+	if size > 1:
+		return buffer.reshape(count, size)
+	return buffer
@@ -0,0 +1,134 @@
+import numpy
+
+
+# Pack island bounding boxes into a bin of size_x * size_y pixels.
+# sizes: (n, 2) width and height of each island in UV units, padding in pixels.
+# Returns the uniform UV scale for all islands and the (n, 2) UV position of each
+# island's bounds minimum. Islands are scaled as large as possible while still fitting.
+def pack_islands(sizes, size_x, size_y, padding, steps=12, fill=0.98):
+	sizes = numpy.asarray(sizes, dtype=numpy.float64)
+	if len(sizes) == 0:
+		return 1.0, numpy.zeros((0, 2))
+
+	# Work in pixels so non square textures keep their aspect ratio
+	sizes_px = sizes * (size_x, size_y)
+	sizes_px = numpy.maximum(sizes_px, 0.0)
+
+	# Upper bound: total area or the largest island touching the bin border
+	area = (sizes_px[:, 0] * sizes_px[:, 1]).sum()
+	scale_max = numpy.inf
+	if area > 0:
+		scale_max = numpy.sqrt(size_x * size_y / area)
+	if sizes_px[:, 0].max() > 0:
+		scale_max = min(scale_max, (size_x - padding) / sizes_px[:, 0].max())
+	if sizes_px[:, 1].max() > 0:
+		scale_max = min(scale_max, (size_y - padding) / sizes_px[:, 1].max())
+	if not numpy.isfinite(scale_max) or scale_max <= 0:
+		scale_max = 1.0
+
+	# Search the largest scale at which the skyline fits the bin height. After an
+	# overflow the next guess shrinks by the height ratio, otherwise it bisects upward.
+	scale_min = 0.0
+	scale = scale_max
+	scale_fit = None
+	positions_fit = None
+	for i in range(steps):
+		positions, height = pack_skyline(sizes_px * scale + padding, size_x)
+		if height <= size_y:
+			scale_fit = scale
+			positions_fit = positions
+			scale_min = scale
+			if height >= size_y * fill or scale >= scale_max:
+				break
+			scale = (scale_min + scale_max) / 2
+		else:
+			scale_max = scale
+			scale_next = (scale_min + scale_max) / 2
+			if height < numpy.inf:
+				scale_next = max(scale_next, scale * numpy.sqrt(size_y / height) * fill)
+			scale = min(scale_next, scale_max)
+
+	if scale_fit is None:
+		scale_fit = scale_min
+		positions_fit, height = pack_skyline(sizes_px * scale_fit + padding, size_x)
+
+	scale = scale_fit
+	positions = positions_fit
+
+	# Padding is split to both sides of each island
+	positions = (positions + padding / 2) / (size_x, size_y)
+
+	return scale, positions
+
+
+
+# Skyline bottom-left packing of rectangles into a strip of fixed width.
+# Each rectangle goes to the lowest (then leftmost) spot on the skyline it fits on.
+# Returns the (n, 2) positions and the height used, inf if a rectangle is too wide.
+def pack_skyline(sizes, width):
+	epsilon = 0.000001
+	positions = numpy.zeros((len(sizes), 2))
+	height = 0.0
+
+	# Tallest first, then widest
+	order = numpy.lexsort((-sizes[:, 0], -sizes[:, 1]))
+
+	# Segments of [x, y, width]
+	skyline = [[0.0, 0.0, width]]
+
+	for index in order:
+		w = sizes[index, 0]
+		h = sizes[index, 1]
+
+		# Visit segments from low to high, a spot can't be lower than its first segment
+		best_i = -1
+		best_y = numpy.inf
+		for i in sorted(range(len(skyline)), key=lambda i: skyline[i][1]):
+			x, y, _ = skyline[i]
+			if y > best_y:
+				break
+			if x + w > width + epsilon:
+				continue
+
+			# Rest on the highest segment under the rectangle
+			remaining = w
+			j = i
+			while remaining > epsilon and j < len(skyline):
+				y = max(y, skyline[j][1])
+				remaining -= skyline[j][2]
+				j += 1
+
+			if y < best_y or (y == best_y and i < best_i):
+				best_y = y
+				best_i = i
+
+		if best_i == -1:
+			return positions, numpy.inf
+
+		x = skyline[best_i][0]
+		positions[index] = (x, best_y)
+		height = max(height, best_y + h)
+
+		# Cut the covered part out of the skyline and insert the new top
+		end = x + w
+		j = best_i
+		while j < len(skyline) and skyline[j][0] < end - epsilon:
+			segment_end = skyline[j][0] + skyline[j][2]
+			if segment_end <= end + epsilon:
+				del skyline[j]
+			else:
+				skyline[j][2] = segment_end - end
+				skyline[j][0] = end
+				break
+		skyline.insert(best_i, [x, best_y + h, w])
+
+		# Merge neighbours of the same height
+		i = max(best_i - 1, 0)
+		while i < len(skyline) - 1 and i <= best_i + 1:
+			if abs(skyline[i][1] - skyline[i+1][1]) <= epsilon:
+				skyline[i][2] += skyline[i+1][2]
+				del skyline[i+1]
+			else:
+				i += 1
+
+	return positions, height
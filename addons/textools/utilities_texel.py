@@ -2,42 +2,34 @@ import bpy
 import bmesh
 import operator
 import time
-import math
+import numpy
 from mathutils import Vector
 
+from . import utilities_uv
+from .utilities_buffer import foreach_get
+
 
 image_material_prefix = "TT_checker_"
 
 
-# Return all faces of selected objects or only selected faces
+# Return all faces of selected objects or only selected faces.
+# Object mode reads the face count from the mesh data, without switching modes.
 def get_selected_object_faces():
 	object_faces_indexies = {}
 
-	previous_mode = bpy.context.object.mode
-
 	if bpy.context.object.mode == 'EDIT':
 		# Only selected Mesh faces
 		obj = bpy.context.active_object
 		if obj.type == 'MESH' and obj.data.uv_layers:
 			bm = bmesh.from_edit_mesh(obj.data)
-			bm.faces.ensure_lookup_table()
+			# Indices can be stale after topology edits, they have to match the mesh polygons
+			bm.faces.index_update()
 			object_faces_indexies[obj] = [face.index for face in bm.faces if face.select]
 	else:
 		# Selected objects with all faces each
-		selected_objects = [obj for obj in bpy.context.selected_objects]
-		for obj in selected_objects:
+		for obj in bpy.context.selected_objects:
 			if obj.type == 'MESH' and obj.data.uv_layers:
-				bpy.ops.object.mode_set(mode='OBJECT')
-				bpy.ops.object.select_all(action='DESELECT')
-				bpy.context.scene.objects.active = obj
-				obj.select = True
-
-				bpy.ops.object.mode_set(mode='EDIT')
-				bm = bmesh.from_edit_mesh(obj.data)
-				bm.faces.ensure_lookup_table()
-				object_faces_indexies[obj] = [face.index for face in bm.faces]
-
-	bpy.ops.object.mode_set(mode=previous_mode)
+				object_faces_indexies[obj] = numpy.arange(len(obj.data.polygons))
 
 	return object_faces_indexies
 
@@ -103,26 +95,226 @@ def get_checker_name(size_x, size_y):
 
 
 
-def get_area_triangle_uv(A,B,C, size_x, size_y):
-	scale_x = size_x / max(size_x, size_y)
-	scale_y = size_y / max(size_x, size_y)
-	A.x/=scale_x
-	B.x/=scale_x
-	C.x/=scale_x
-	
-	A.y/=scale_y
-	B.y/=scale_y
-	C.y/=scale_y
+# Area of every face in world space and in texture space, for all faces at once.
+# Faces are fan triangulated; summing the signed triangle areas (vector areas in 3D)
+# gives the exact area of concave n-gons as well. UV's are aspect corrected so the
+# longer texture side spans 1, and UV areas are in texels of the shorter side.
+# Returns two (faces) float64 arrays: area_vt, area_uv. use_world=False keeps object space.
+def get_face_areas(obj, buffer, size_x, size_y, use_world=True):
+	tri_loops, tri_faces = buffer.get_triangles()
+
+	co = foreach_get(buffer.mesh.vertices, 'co', buffer.count_verts, 3, numpy.float64)
+	if use_world:
+		matrix = numpy.array(obj.matrix_world, dtype=numpy.float64)
+		co = co.dot(matrix[:3, :3].T)
+
+	tris_vt = co[buffer.loop_verts[tri_loops]]
+	cross_vt = numpy.cross(tris_vt[:, 1] - tris_vt[:, 0], tris_vt[:, 2] - tris_vt[:, 0])
+	vector_area = numpy.column_stack([
+		numpy.bincount(tri_faces, weights=cross_vt[:, i], minlength=buffer.count_faces) for i in range(3)
+	])
+	area_vt = numpy.sqrt((vector_area ** 2).sum(axis=1)) / 2
+
+	size_max = max(size_x, size_y)
+	tris_uv = buffer.uvs[tri_loops].astype(numpy.float64) * (size_max / size_x, size_max / size_y)
+	a = tris_uv[:, 1] - tris_uv[:, 0]
+	b = tris_uv[:, 2] - tris_uv[:, 0]
+	cross_uv = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+	area_uv = numpy.abs(numpy.bincount(tri_faces, weights=cross_uv, minlength=buffer.count_faces)) / 2
+	area_uv *= min(size_x, size_y) ** 2
+
+	return area_vt, area_uv
+
+
+
+# Texel density (texels per unit) of each face, 0 for degenerate faces
+def get_texel_density_faces(area_vt, area_uv):
+	density = numpy.zeros(len(area_vt))
+	valid = area_vt > 0
+	density[valid] = numpy.sqrt(area_uv[valid] / area_vt[valid])
+	return density
+
+
+
+# Texel density of groups of faces: face_labels (faces) with values 0..count-1, -1 to skip.
+# Like a single face it is the ratio of the summed edge lengths, sum(sqrt(uv)) / sum(sqrt(vt)).
+def get_texel_density_labels(area_vt, area_uv, face_labels, count):
+	valid = face_labels >= 0
+	sum_vt = numpy.bincount(face_labels[valid], weights=numpy.sqrt(area_vt[valid]), minlength=count)
+	sum_uv = numpy.bincount(face_labels[valid], weights=numpy.sqrt(area_uv[valid]), minlength=count)
+
+	density = numpy.zeros(count)
+	density[sum_vt > 0] = sum_uv[sum_vt > 0] / sum_vt[sum_vt > 0]
+	return density
+
+
+
+# Texel density of a set of faces (None for all faces) as a single value
+def get_texel_density(area_vt, area_uv, faces=None):
+	face_labels = numpy.zeros(len(area_vt), dtype=numpy.int64)
+	if faces is not None:
+		face_labels[:] = -1
+		face_labels[faces] = 0
+	return get_texel_density_labels(area_vt, area_uv, face_labels, 1)[0]
+
+
+
+# Texel density of each island, islands as lists of face indices
+def get_texel_density_islands(area_vt, area_uv, islands):
+	face_labels = utilities_uv.get_island_face_labels(len(area_vt), islands)
+	return get_texel_density_labels(area_vt, area_uv, face_labels, len(islands))
+
+
+
+# Heatmap color (n, 3) per density relative to a target density: blue below,
+# green on target and red above, saturating at 2^octaves times off. Faces
+# without a density (degenerate) are magenta.
+def get_heatmap_colors(density, target, octaves=2.0):
+	valid = density > 0
+	ratio = numpy.zeros(len(density))
+	ratio[valid] = numpy.clip(numpy.log2(density[valid] / target) / octaves, -1, 1)
+
+	colors = numpy.empty((len(density), 3), dtype=numpy.float32)
+	colors[:, 0] = numpy.clip(ratio, 0, 1)
+	colors[:, 1] = 1 - numpy.abs(ratio)
+	colors[:, 2] = numpy.clip(-ratio, 0, 1)
+	colors[~valid] = (1, 0, 1)
+	return colors
+
+
+
+# Rasterize UV triangles (tris, 3, 2) into a size_x * size_y texel grid and count
+# how often each texel center is covered. Scanline spans are accumulated in a
+# difference array, one band of rows at a time, with triangles streamed in chunks
+# so memory stays bounded (memory_budget in bytes) even for 8K grids.
+# Returns a dict with 'empty', 'single', 'overlap' texel counts, 'total', 'wasted'
+# (percentage of empty texels) and 'buffer' if keep_buffer: a uint8 preview of the
+# counts, at most buffer_size texels wide and high, each texel the max of its block.
+def get_uv_coverage(tris_uv, size_x, size_y, keep_buffer=False, memory_budget=64*1024*1024, buffer_size=2048):
+	tris = numpy.asarray(tris_uv, dtype=numpy.float64) * (size_x, size_y)
+
+	# Rows whose texel centers lie in [min y, max y)
+	row_start = numpy.ceil(tris[:, :, 1].min(axis=1) - 0.5).astype(numpy.int64)
+	row_end = numpy.ceil(tris[:, :, 1].max(axis=1) - 0.5).astype(numpy.int64)
+	row_start = numpy.clip(row_start, 0, size_y)
+	row_end = numpy.clip(row_end, 0, size_y)
+
+	valid = row_end > row_start
+	tris = tris[valid]
+	row_start = row_start[valid]
+	row_end = row_end[valid]
+
+	order = numpy.argsort(row_start, kind='stable')
+	tris = tris[order]
+	row_start = row_start[order]
+	row_end = row_end[order]
+
+	band_rows = int(max(1, min(size_y, memory_budget // (8 * (size_x + 1)))))
+	span_budget = max(1, memory_budget // 64)
+
+	histogram = numpy.zeros(3, dtype=numpy.int64)
+	buffer = None
+	if keep_buffer:
+		# Bands cover whole blocks of the preview
+		factor = max(1, -(-max(size_x, size_y) // buffer_size))
+		band_rows = max(factor, band_rows // factor * factor)
+		buffer = numpy.zeros((-(-size_y // factor), -(-size_x // factor)), dtype=numpy.uint8)
+
+	for band_start in range(0, size_y, band_rows):
+		band_end = min(band_start + band_rows, size_y)
+		diff = numpy.zeros((band_end - band_start, size_x + 1), dtype=numpy.int64)
+
+		# Triangles sorted by first row: all candidates start before the band ends
+		candidates = numpy.arange(numpy.searchsorted(row_start, band_end, side='left'))
+		candidates = candidates[row_end[candidates] > band_start]
+
+		# Stream triangles in chunks of bounded span count
+		spans = numpy.minimum(row_end[candidates], band_end) - numpy.maximum(row_start[candidates], band_start)
+		chunk_ids = numpy.cumsum(spans) // span_budget
+		for chunk in numpy.unique(chunk_ids):
+			indices = candidates[chunk_ids == chunk]
+			add_coverage_spans(diff, tris[indices], 
+				numpy.maximum(row_start[indices], band_start), 
+				numpy.minimum(row_end[indices], band_end), 
+				band_start, size_x
+			)
+
+		counts = numpy.cumsum(diff, axis=1)[:, :size_x]
+		histogram += numpy.bincount(numpy.minimum(counts, 2).ravel(), minlength=3)[:3]
+		if keep_buffer:
+			blocks = numpy.zeros((-(-counts.shape[0] // factor) * factor, buffer.shape[1] * factor), dtype=numpy.uint8)
+			blocks[:counts.shape[0], :size_x] = numpy.minimum(counts, 255)
+			blocks = blocks.reshape(-1, factor, buffer.shape[1], factor).max(axis=(1, 3))
+			buffer[band_start // factor:band_start // factor + len(blocks)] = blocks
+
+	coverage = {}
+	coverage['empty'] = int(histogram[0])
+	coverage['single'] = int(histogram[1])
+	coverage['overlap'] = int(histogram[2])
+	coverage['total'] = size_x * size_y
+	coverage['wasted'] = 100.0 * int(histogram[0]) / max(1, size_x * size_y)
+	coverage['buffer'] = buffer
+
+	return coverage
+
+
+
+# Add the scanline spans of triangles (pixel space) for rows [start, end) to a difference array
+def add_coverage_spans(diff, tris, start, end, band_start, size_x):
+	# Vertices sorted bottom to top: the long edge 0-2 crosses every row,
+	# the short side is edge 0-1 below vertex 1 and edge 1-2 above it
+	order = numpy.argsort(tris[:, :, 1], axis=1)
+	tris = numpy.take_along_axis(tris, order[:, :, None], axis=1)
+	x0, y0 = tris[:, 0, 0], tris[:, 0, 1]
+	x1, y1 = tris[:, 1, 0], tris[:, 1, 1]
+	x2, y2 = tris[:, 2, 0], tris[:, 2, 1]
+
+	def slope(dx, dy):
+		return dx / numpy.where(dy != 0, dy, 1)
+	slope_02 = slope(x2 - x0, y2 - y0)
+	slope_01 = slope(x1 - x0, y1 - y0)
+	slope_12 = slope(x2 - x1, y2 - y1)
+
+	counts = end - start
+	tri = numpy.repeat(numpy.arange(len(tris)), counts)
+	rows = start[tri] + numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+	y = rows + 0.5
+
+	x_long = x0[tri] + (y - y0[tri]) * slope_02[tri]
+	x_short = numpy.where(y < y1[tri],
+		x0[tri] + (y - y0[tri]) * slope_01[tri],
+		x1[tri] + (y - y1[tri]) * slope_12[tri]
+	)
+
+	# Texel centers in [x_min, x_max), half open so shared edges count once
+	column_start = numpy.clip(numpy.ceil(numpy.minimum(x_long, x_short) - 0.5), 0, size_x).astype(numpy.int64)
+	column_end = numpy.clip(numpy.ceil(numpy.maximum(x_long, x_short) - 0.5), 0, size_x).astype(numpy.int64)
+	valid = column_end > column_start
+
+	rows = rows[valid] - band_start
+	width = size_x + 1
+	diff += numpy.bincount(rows * width + column_start[valid], minlength=diff.size).reshape(diff.shape)
+	diff -= numpy.bincount(rows * width + column_end[valid], minlength=diff.size).reshape(diff.shape)
+
 
-	return get_area_triangle(A,B,C)
 
+# Write a coverage count buffer into an image: empty black, single green, overlap red.
+# The buffer is the capped preview of get_uv_coverage, not the full texture size.
+def coverage_image(name, buffer):
+	size_y, size_x = buffer.shape
+	if name in bpy.data.images and tuple(bpy.data.images[name].size) != (size_x, size_y):
+		bpy.data.images.remove(bpy.data.images[name])
+	if name not in bpy.data.images:
+		bpy.data.images.new(name, width=size_x, height=size_y)
+	image = bpy.data.images[name]
 
+	colors = numpy.array([
+		[0.0, 0.0, 0.0, 1.0],
+		[0.0, 0.6, 0.0, 1.0],
+		[1.0, 0.0, 0.0, 1.0]
+	], dtype=numpy.float32)
+	pixels = colors[numpy.minimum(buffer, 2)]
+	image.pixels[:] = pixels.ravel()
+	image.update()
 
-def get_area_triangle(A,B,C):
-	# Heron's formula: http://www.1728.org/triang.htm
-	# area = square root (s • (s - a) • (s - b) • (s - c))
-	a = (B-A).length
-	b = (C-B).length
-	c = (A-C).length
-	s = (a+b+c)/2
-	return math.sqrt(s * (s-a) * (s-b) * (s-c))
\ No newline at end of file
+	return image
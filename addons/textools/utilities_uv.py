@@ -2,84 +2,111 @@ import bpy
 import bmesh
 import operator
 import time
+import numpy
 from mathutils import Vector
-from collections import defaultdict
+from mathutils.geometry import convex_hull_2d
+from collections import defaultdict, Counter
 from math import pi
+import math
 
 from . import settings
+from . import utilities_buffer
 
+# Returns a snapshot of the selection, pass it back to selection_restore()
 def selection_store():
-	bm = bmesh.from_edit_mesh(bpy.context.active_object.data);
-	uvLayer = bm.loops.layers.uv.verify();
+	return SelectionSnapshot(bpy.context.active_object)
 
-	# https://blender.stackexchange.com/questions/5781/how-to-list-all-selected-elements-in-python
-	# print("selectionStore")
-	settings.selection_uv_mode = bpy.context.scene.tool_settings.uv_select_mode
-	settings.selection_uv_pivot = bpy.context.space_data.pivot_point
-	
-	settings.selection_uv_pivot_pos = bpy.context.space_data.cursor_location.copy()
-
-	#VERT Selection
-	settings.selection_mode = tuple(bpy.context.scene.tool_settings.mesh_select_mode)
-	settings.selection_vert_indexies = []
-	for vert in bm.verts:
-		if vert.select:
-			settings.selection_vert_indexies.append(vert.index)
-
-	settings.selection_face_indexies = []
-	for face in bm.faces:
-		if face.select:
-			settings.selection_face_indexies.append(face.index)
 
+def selection_restore(snapshot):
+	snapshot.restore()
 
-	#Face selections (Loops)
-	settings.selection_uv_loops = []
-	for face in bm.faces:
-		for loop in face.loops:
-			if loop[uvLayer].select:
-				settings.selection_uv_loops.append(loop[uvLayer])
 
 
-def selection_restore():
-	bm = bmesh.from_edit_mesh(bpy.context.active_object.data);
-	uvLayer = bm.loops.layers.uv.verify();
+# Vert, edge, face and UV loop selection packed into numpy bool arrays, captured
+# with one foreach_get per element type. In edit mode it is restored through the
+# edit bmesh without leaving edit mode, so bmesh references of the caller stay valid.
+class SelectionSnapshot:
+	obj = None
+	uv_layer_name = ""
 
-	# print("selectionRestore")
-	bpy.context.scene.tool_settings.uv_select_mode = settings.selection_uv_mode
-	bpy.context.space_data.pivot_point = settings.selection_uv_pivot
+	uv_select_mode = ''
+	uv_pivot = ''
+	uv_pivot_pos = (0,0)
+	mesh_select_mode = (False, False, True)
 
-	bpy.ops.uv.cursor_set(location=settings.selection_uv_pivot_pos)
+	verts = None
+	edges = None
+	faces = None
+	uv_loops = None
 
+	def __init__(self, obj):
+		# https://blender.stackexchange.com/questions/5781/how-to-list-all-selected-elements-in-python
+		self.obj = obj
+		self.uv_select_mode = bpy.context.scene.tool_settings.uv_select_mode
+		self.uv_pivot = bpy.context.space_data.pivot_point
+		self.uv_pivot_pos = bpy.context.space_data.cursor_location.copy()
+		self.mesh_select_mode = tuple(bpy.context.scene.tool_settings.mesh_select_mode)
 
-	bpy.ops.mesh.select_all(action='DESELECT')
+		if obj.mode == 'EDIT':
+			obj.update_from_editmode()
 
-	if hasattr(bm.verts, "ensure_lookup_table"): 
-		bm.verts.ensure_lookup_table()
-		# bm.edges.ensure_lookup_table()
-		bm.faces.ensure_lookup_table()
+		mesh = obj.data
+		self.verts = utilities_buffer.foreach_get(mesh.vertices, 'select', len(mesh.vertices), 1, bool)
+		self.edges = utilities_buffer.foreach_get(mesh.edges, 'select', len(mesh.edges), 1, bool)
+		self.faces = utilities_buffer.foreach_get(mesh.polygons, 'select', len(mesh.polygons), 1, bool)
 
-	#VERT Selection
-	bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='VERT')
-	for index in settings.selection_vert_indexies:
-		if index < len(bm.verts):
-			bm.verts[index].select = True
+		# Meshes without UV maps only store the mesh selection
+		uv_layer = mesh.uv_layers.active
+		if uv_layer is not None:
+			self.uv_layer_name = uv_layer.name
+			self.uv_loops = utilities_buffer.foreach_get(uv_layer.data, 'select', len(mesh.loops), 1, bool)
 
-	#FACE selection
-	bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='FACE')
-	for index in settings.selection_face_indexies:
-		if index < len(bm.faces):
-			bm.faces[index].select = True
 
-	#Selection Mode
-	bpy.context.scene.tool_settings.mesh_select_mode = settings.selection_mode
+	def restore(self):
+		bpy.context.scene.tool_settings.uv_select_mode = self.uv_select_mode
+		bpy.context.space_data.pivot_point = self.uv_pivot
+		bpy.ops.uv.cursor_set(location=self.uv_pivot_pos)
 
+		obj = self.obj
+		mesh = obj.data
+		if obj.mode == 'EDIT':
+			bm = bmesh.from_edit_mesh(mesh)
 
-	#UV Face-UV Selections (Loops)
-	bpy.ops.uv.select_all(action='DESELECT')
-	for loop in settings.selection_uv_loops:
-		loop.select = True
+			# Selecting flushes down to edges and verts: faces first, verts last
+			for elements, select in [(bm.faces, self.faces), (bm.edges, self.edges), (bm.verts, self.verts)]:
+				for element, is_selected in zip(elements, fit_array(select, len(elements)).tolist()):
+					element.select = is_selected
 
-	bpy.context.scene.update()
+			# Mesh loops are stored in face order
+			uv_layer = bm.loops.layers.uv.get(self.uv_layer_name) if self.uv_loops is not None else None
+			if uv_layer is not None:
+				select = iter(fit_array(self.uv_loops, sum(len(face.loops) for face in bm.faces)).tolist())
+				for face in bm.faces:
+					for loop in face.loops:
+						loop[uv_layer].select = next(select)
+
+			bmesh.update_edit_mesh(mesh)
+		else:
+			mesh.vertices.foreach_set('select', fit_array(self.verts, len(mesh.vertices)))
+			mesh.edges.foreach_set('select', fit_array(self.edges, len(mesh.edges)))
+			mesh.polygons.foreach_set('select', fit_array(self.faces, len(mesh.polygons)))
+			if self.uv_loops is not None and self.uv_layer_name in mesh.uv_layers:
+				mesh.uv_layers[self.uv_layer_name].data.foreach_set('select', fit_array(self.uv_loops, len(mesh.loops)))
+			mesh.update()
+
+		bpy.context.scene.tool_settings.mesh_select_mode = self.mesh_select_mode
+		bpy.context.scene.update()
+
+
+
+# Truncate or pad (unselected) a stored selection array when the element count changed
+def fit_array(array, count):
+	if len(array) == count:
+		return array
+	result = numpy.zeros(count, dtype=array.dtype)
+	size = min(count, len(array))
+	result[:size] = array[:size]
+	return result
 
 
 def getSelectedFaces():
@@ -101,44 +128,622 @@ def setSelectedFaces(faces):
 
 
 
+# Bounds of the selected UV's of the whole mesh, reads only the UV and selection
+# arrays. Loops over islands use get_bbox_faces() instead.
 def getSelectionBBox():
-	bm = bmesh.from_edit_mesh(bpy.context.active_object.data);
-	uvLayer = bm.loops.layers.uv.verify();
-	
+	obj = bpy.context.active_object
+	if obj.mode == 'EDIT':
+		obj.update_from_editmode()
+
+	uv_layer = obj.data.uv_layers.active
+	count = len(obj.data.loops)
+	uvs = utilities_buffer.foreach_get(uv_layer.data, 'uv', count, 2)
+	select = utilities_buffer.foreach_get(uv_layer.data, 'select', count, 1, bool)
+	return get_bbox(uvs[select])
+
+
+
+# Bounds of all UV's of a list of bmesh faces, walks only these faces
+def get_bbox_faces(uvLayer, faces):
+	uvs = [loop[uvLayer].uv[:] for face in faces for loop in face.loops]
+	return get_bbox(numpy.array(uvs, dtype=numpy.float32).reshape(-1, 2))
+
+
+
+# Bounding box of a (n, 2) UV array; center is the average of the UV's
+def get_bbox(uvs):
 	bbox = {}
-	
-	boundsMin = Vector((99999999.0,99999999.0))
-	boundsMax = Vector((-99999999.0,-99999999.0))
-	boundsCenter = Vector((0.0,0.0))
-	countFaces = 0;
-	
-	for face in bm.faces:
-		# if face.select == True:
-		for loop in face.loops:
-			if loop[uvLayer].select is True:
-				uv = loop[uvLayer].uv
-				boundsMin.x = min(boundsMin.x, uv.x)
-				boundsMin.y = min(boundsMin.y, uv.y)
-				boundsMax.x = max(boundsMax.x, uv.x)
-				boundsMax.y = max(boundsMax.y, uv.y)
-		
-				boundsCenter+= uv
-				countFaces+=1
-	
+
+	if len(uvs) == 0:
+		boundsMin = Vector((99999999.0,99999999.0))
+		boundsMax = Vector((-99999999.0,-99999999.0))
+		boundsCenter = boundsMin
+	else:
+		boundsMin = Vector(uvs.min(axis=0))
+		boundsMax = Vector(uvs.max(axis=0))
+		boundsCenter = Vector(uvs.mean(axis=0, dtype=numpy.float64))
+
 	bbox['min'] = boundsMin
 	bbox['max'] = boundsMax
 	bbox['width'] = (boundsMax - boundsMin).x
 	bbox['height'] = (boundsMax - boundsMin).y
-	
-	if countFaces == 0:
-		bbox['center'] = boundsMin
-	else:
-		bbox['center'] = boundsCenter / countFaces
-
+	bbox['center'] = boundsCenter
 	bbox['area'] = bbox['width'] * bbox['height']
 	bbox['minLength'] = min(bbox['width'], bbox['height'])
-				
-	return bbox;
+
+	return bbox
+
+
+
+# Bounding boxes of N islands at once from a (loops, 2) UV array and a per loop
+# island label array (-1 for loops outside any island). Same keys as get_bbox
+# but every value is an array with one row per island.
+def get_bbox_labels(uvs, loop_labels, count):
+	valid = loop_labels >= 0
+	labels = loop_labels[valid]
+	uvs = uvs[valid].astype(numpy.float64)
+
+	bounds_min = numpy.full((count, 2), 99999999.0)
+	bounds_max = numpy.full((count, 2), -99999999.0)
+	bounds_center = bounds_min.copy()	# Islands without loops keep their min as center
+
+	if len(labels) > 0:
+		order = numpy.argsort(labels, kind='stable')
+		labels = labels[order]
+		uvs = uvs[order]
+		starts = numpy.flatnonzero(numpy.r_[True, labels[1:] != labels[:-1]])
+		labels_used = labels[starts]
+
+		bounds_min[labels_used] = numpy.minimum.reduceat(uvs, starts, axis=0)
+		bounds_max[labels_used] = numpy.maximum.reduceat(uvs, starts, axis=0)
+		counts = numpy.diff(numpy.r_[starts, len(labels)])
+		bounds_center[labels_used] = numpy.add.reduceat(uvs, starts, axis=0) / counts[:, None]
+
+	size = bounds_max - bounds_min
+
+	bbox = {}
+	bbox['min'] = bounds_min
+	bbox['max'] = bounds_max
+	bbox['width'] = size[:, 0]
+	bbox['height'] = size[:, 1]
+	bbox['center'] = bounds_center
+	bbox['area'] = size[:, 0] * size[:, 1]
+	bbox['minLength'] = size.min(axis=1)
+
+	return bbox
+
+
+
+# Bounding boxes of islands given as face index arrays, read from a UVBuffer
+def get_bbox_islands(buffer, islands):
+	face_labels = get_island_face_labels(buffer.count_faces, islands)
+	return get_bbox_labels(buffer.uvs, buffer.get_loop_labels(face_labels), len(islands))
+
+
+
+# Pairs (A, B) of boxes with intersecting (or touching) bounds, A < B.
+# Grid broad phase with cells of about the median box size, grown until each box
+# covers only a few cells on average, so columns or rows of boxes stay linear.
+def get_bbox_overlap_pairs(bounds_min, bounds_max, cells_per_box=8):
+	bounds_min = numpy.asarray(bounds_min, dtype=numpy.float64)
+	bounds_max = numpy.asarray(bounds_max, dtype=numpy.float64)
+	count = len(bounds_min)
+	if count < 2:
+		empty = numpy.zeros(0, dtype=numpy.int64)
+		return empty, empty
+
+	extent = (bounds_max.max(axis=0) - bounds_min.min(axis=0)).max()
+	cell_size = max(numpy.median((bounds_max - bounds_min).max(axis=1)), extent / 4096, 0.000000000001)
+	while True:
+		span = numpy.floor(bounds_max / cell_size) - numpy.floor(bounds_min / cell_size) + 1
+		if (span[:, 0] * span[:, 1]).sum() <= cells_per_box * count:
+			break
+		cell_size *= 2
+
+	A, B = get_grid_candidate_pairs(bounds_min, bounds_max, cell_size)
+
+	overlap = numpy.all(bounds_min[B] <= bounds_max[A], axis=1) & numpy.all(bounds_min[A] <= bounds_max[B], axis=1)
+	return A[overlap], B[overlap]
+
+
+
+# Candidate pairs (A, B), A < B, of boxes sharing a cell of a uniform grid.
+# Each box is binned into every cell it covers; pairs are unique.
+def get_grid_candidate_pairs(bounds_min, bounds_max, cell_size):
+	origin = bounds_min.min(axis=0)
+	count_x = int(numpy.floor((bounds_max[:, 0].max() - origin[0]) / cell_size)) + 1
+	boxes, cells = get_grid_cells(bounds_min, bounds_max, origin, cell_size, count_x)[:2]
+
+	order = numpy.argsort(cells, kind='stable')
+	cells = cells[order]
+	boxes = boxes[order]
+
+	# Pair every entry with the following entries of the same cell
+	ends = numpy.searchsorted(cells, cells, side='right')
+	counts = ends - numpy.arange(1, len(cells) + 1)
+	first = numpy.repeat(numpy.arange(len(cells)), counts)
+	second = first + 1 + get_range_offsets(counts)
+
+	A = numpy.minimum(boxes[first], boxes[second])
+	B = numpy.maximum(boxes[first], boxes[second])
+	keys = numpy.unique(A * len(bounds_min) + B)
+
+	return keys // len(bounds_min), keys % len(bounds_min)
+
+
+
+# One (box, cell) entry per grid cell covered by each box, cells numbered row by row.
+# Also returns whether the cell is in the first column (2) and / or row (1) of the box.
+def get_grid_cells(bounds_min, bounds_max, origin, cell_size, count_x):
+	cells_min = numpy.floor((bounds_min - origin) / cell_size).astype(numpy.int64)
+	cells_max = numpy.floor((bounds_max - origin) / cell_size).astype(numpy.int64)
+	span = cells_max - cells_min + 1
+
+	counts = span[:, 0] * span[:, 1]
+	boxes = numpy.repeat(numpy.arange(len(bounds_min)), counts)
+	offsets = get_range_offsets(counts)
+	offset_x = offsets % span[boxes, 0]
+	offset_y = offsets // span[boxes, 0]
+	cells = (cells_min[boxes, 1] + offset_y) * count_x + cells_min[boxes, 0] + offset_x
+	return boxes, cells, (offset_x == 0) * 2 + (offset_y == 0)
+
+
+
+# 0..count-1 for each count, concatenated
+def get_range_offsets(counts):
+	return numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+
+
+
+# Candidate pairs (A, B), A < B, of boxes with different labels whose bounds overlap.
+# Multi level grid: each box is binned on the level whose cell size is at least its
+# size, so it covers at most 2x2 cells and large boxes don't fill the cells of the
+# small ones. Boxes are looked up on their own and every coarser level.
+# A pair is only expanded in the cell holding the lower corner of the overlap, the
+# cell where the later starting box of both starts, per axis. Entries are sorted by
+# cell, whether the cell starts their column and row, and label, so each lookup is
+# a few ranges that skip entries of its own label.
+def get_grid_label_pairs(bounds_min, bounds_max, labels, resolution=65536):
+	labels = numpy.unique(labels, return_inverse=True)[1].astype(numpy.int64).ravel()
+	count_labels = labels.max() + 1
+
+	origin = bounds_min.min(axis=0)
+	extent = max((bounds_max.max(axis=0) - origin).max(), numpy.finfo(float).tiny)
+	cell_base = extent / resolution
+	sizes = numpy.maximum((bounds_max - bounds_min).max(axis=1), cell_base)
+	levels = numpy.ceil(numpy.log2(sizes / cell_base) - 0.000001).clip(0).astype(numpy.int64)
+
+	pairs_A = []
+	pairs_B = []
+	for level in numpy.unique(levels).tolist():
+		cell_size = cell_base * 2.0 ** level
+		count_x = int(extent / cell_size) + 2
+
+		entries = numpy.flatnonzero(levels == level)
+		boxes, cells, starts = get_grid_cells(bounds_min[entries], bounds_max[entries], origin, cell_size, count_x)
+		boxes = entries[boxes]
+		keys = ((cells * 4 + starts) * count_labels) + labels[boxes]
+		order = numpy.argsort(keys, kind='stable')
+		keys = keys[order]
+		boxes = boxes[order]
+
+		# Boxes of this and all finer levels looked up in the cells of the entries
+		queries = numpy.flatnonzero(levels <= level)
+		query_boxes, query_cells, query_starts = get_grid_cells(bounds_min[queries], bounds_max[queries], origin, cell_size, count_x)
+		query_boxes = queries[query_boxes]
+		query_labels = labels[query_boxes]
+
+		# Where the query box doesn't start, the entry has to
+		required = 3 - query_starts
+
+		range_query = []
+		range_start = []
+		range_count = []
+		for start in range(4):
+			allowed = numpy.flatnonzero((start & required) == required)
+			base = (query_cells[allowed] * 4 + start) * count_labels
+			first = numpy.searchsorted(keys, base)
+			last = numpy.searchsorted(keys, base + count_labels)
+			same_first = numpy.searchsorted(keys, base + query_labels[allowed])
+			same_last = numpy.searchsorted(keys, base + query_labels[allowed], side='right')
+			range_query += [allowed, allowed]
+			range_start += [first, same_last]
+			range_count += [same_first - first, last - same_last]
+
+		range_query = numpy.concatenate(range_query)
+		range_start = numpy.concatenate(range_start)
+		range_count = numpy.concatenate(range_count)
+
+		rows = numpy.repeat(range_query, range_count)
+		A = query_boxes[rows]
+		B = boxes[numpy.repeat(range_start, range_count) + get_range_offsets(range_count)]
+
+		# Pairs within this level are found from both sides
+		keep = (levels[A] < level) | (A < B)
+		A = A[keep]
+		B = B[keep]
+		keep = numpy.all(bounds_min[A] <= bounds_max[B], axis=1) & numpy.all(bounds_min[B] <= bounds_max[A], axis=1)
+		pairs_A.append(numpy.minimum(A[keep], B[keep]))
+		pairs_B.append(numpy.maximum(A[keep], B[keep]))
+
+	return numpy.concatenate(pairs_A), numpy.concatenate(pairs_B)
+
+
+
+# Pairs of triangles of different islands whose interiors intersect.
+# tris_uv: (tris, 3, 2), tri_labels: island per triangle.
+# Multi level grid broad phase on the triangle bounds, separating axis test as
+# narrow phase in chunks to bound the memory of large candidate sets.
+def get_triangle_overlap_pairs(tris_uv, tri_labels, epsilon=0.0000001, chunk=16384):
+	empty = numpy.zeros(0, dtype=numpy.int64)
+	if len(tris_uv) < 2:
+		return empty, empty
+
+	bounds_min, bounds_max = get_triangles_bounds(tris_uv)
+	A, B = get_grid_label_pairs(bounds_min, bounds_max, tri_labels)
+
+	keep = numpy.all(bounds_min[A] < bounds_max[B], axis=1) & numpy.all(bounds_min[B] < bounds_max[A], axis=1)
+	A = A[keep]
+	B = B[keep]
+
+	overlap = numpy.zeros(len(A), dtype=bool)
+	for start in range(0, len(A), chunk):
+		overlap[start:start+chunk] = get_triangles_intersect(tris_uv[A[start:start+chunk]], tris_uv[B[start:start+chunk]], epsilon)
+	return A[overlap], B[overlap]
+
+
+
+# Separating axis test for N triangle pairs (N, 3, 2); True where the interiors intersect.
+# Reductions over the 3 vertices are unrolled, numpy reduces short axes slowly.
+def get_triangles_intersect(P, Q, epsilon=0.0000001):
+	edges = numpy.concatenate((P[:, [1, 2, 0]] - P, Q[:, [1, 2, 0]] - Q), axis=1)
+
+	# Unit axes so the projections are distances in UV space
+	axis_x = -edges[:, :, 1]
+	axis_y = edges[:, :, 0]
+	length = numpy.maximum(numpy.sqrt(axis_x * axis_x + axis_y * axis_y), numpy.finfo(float).tiny)
+	axis_x /= length
+	axis_y /= length
+
+	min_P, max_P = get_triangles_projection(P, axis_x, axis_y)		# (N, 6)
+	min_Q, max_Q = get_triangles_projection(Q, axis_x, axis_y)
+
+	# The tolerance is relative to the size of each pair, independent of the UV scale
+	bounds_min_P, bounds_max_P = get_triangles_bounds(P)
+	bounds_min_Q, bounds_max_Q = get_triangles_bounds(Q)
+	bounds_min = numpy.minimum(bounds_min_P, bounds_min_Q)
+	bounds_max = numpy.maximum(bounds_max_P, bounds_max_Q)
+	extent = numpy.maximum(numpy.maximum(bounds_max[:, 0] - bounds_min[:, 0], bounds_max[:, 1] - bounds_min[:, 1]), numpy.finfo(float).tiny)
+	tolerance = (epsilon * extent)[:, None]
+
+	separated = (max_P <= min_Q + tolerance) | (max_Q <= min_P + tolerance)
+
+	# Degenerate triangles cover no area
+	area_P = numpy.abs(get_cross_2d(P[:, 1] - P[:, 0], P[:, 2] - P[:, 0]))
+	area_Q = numpy.abs(get_cross_2d(Q[:, 1] - Q[:, 0], Q[:, 2] - Q[:, 0]))
+	area_min = epsilon * extent * extent
+
+	return ~separated.any(axis=1) & (area_P > area_min) & (area_Q > area_min)
+
+
+
+# Range of the (N, 3, 2) triangles projected onto (N, axes) unit axes
+def get_triangles_projection(T, axis_x, axis_y):
+	a = axis_x * T[:, None, 0, 0] + axis_y * T[:, None, 0, 1]
+	b = axis_x * T[:, None, 1, 0] + axis_y * T[:, None, 1, 1]
+	c = axis_x * T[:, None, 2, 0] + axis_y * T[:, None, 2, 1]
+	return numpy.minimum(numpy.minimum(a, b), c), numpy.maximum(numpy.maximum(a, b), c)
+
+
+
+# Bounds (N, 2) of (N, 3, 2) triangles
+def get_triangles_bounds(T):
+	return numpy.minimum(numpy.minimum(T[:, 0], T[:, 1]), T[:, 2]), numpy.maximum(numpy.maximum(T[:, 0], T[:, 1]), T[:, 2])
+
+
+
+# Z component of the cross product of (N, 2) vectors
+def get_cross_2d(a, b):
+	return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+
+# Areas of the intersections of N triangle pairs (N, 3, 2). Sutherland-Hodgman
+# clipping of each Q by the edges of its P on fixed size vertex arrays: every
+# vertex emits an edge crossing and itself, unused slots are compacted after each edge.
+def get_triangles_intersection_area(P, Q):
+	count = len(P)
+	rows = numpy.arange(count)
+
+	# Clip against counter clockwise triangles
+	P = P.astype(numpy.float64)
+	flip = get_cross_2d(P[:, 1] - P[:, 0], P[:, 2] - P[:, 0]) < 0
+	P[flip] = P[flip][:, ::-1]
+
+	polygon = Q.astype(numpy.float64)
+	counts = numpy.full(count, 3)
+	for i in range(3):
+		a = P[:, i]
+		edge = P[:, (i+1) % 3] - a
+		side = get_cross_2d(edge[:, None, :], polygon - a[:, None, :])
+		width = polygon.shape[1]
+
+		points = numpy.zeros((count, width * 2, 2))
+		valid = numpy.zeros((count, width * 2), dtype=bool)
+		for j in range(width):
+			active = j < counts
+			previous = (j - 1) % numpy.maximum(counts, 1)
+			side_current = side[:, j]
+			side_previous = side[rows, previous]
+			is_inside = side_current >= 0
+
+			crossing = active & (is_inside != (side_previous >= 0))
+			t = side_previous / numpy.where(crossing, side_previous - side_current, 1)
+			points[:, 2*j] = polygon[rows, previous] + t[:, None] * (polygon[:, j] - polygon[rows, previous])
+			valid[:, 2*j] = crossing
+			points[:, 2*j+1] = polygon[:, j]
+			valid[:, 2*j+1] = active & is_inside
+
+		order = numpy.argsort(~valid, axis=1, kind='stable')
+		counts = valid.sum(axis=1)
+		polygon = numpy.take_along_axis(points, order[:, :, None], axis=1)[:, :max(counts.max(), 1)]
+
+	# Shoelace formula over the used slots
+	slots = numpy.arange(polygon.shape[1])
+	following = (slots[None, :] + 1) % numpy.maximum(counts, 1)[:, None]
+	x = polygon[:, :, 0]
+	y = polygon[:, :, 1]
+	terms = x * numpy.take_along_axis(y, following, axis=1) - numpy.take_along_axis(x, following, axis=1) * y
+	terms[slots[None, :] >= counts[:, None]] = 0
+
+	area = numpy.abs(terms.sum(axis=1)) / 2
+	area[counts < 3] = 0
+	return area
+
+
+
+# Exact overlap between islands (face index arrays) of a UVBuffer.
+# Only islands with intersecting bounds are triangulated and tested.
+# Returns the overlapping face indices and the summed overlap area in UV space.
+def get_islands_overlap_exact(buffer, islands, chunk=16384):
+	bounds = get_bbox_islands(buffer, islands)
+	pairs_A, pairs_B = get_bbox_overlap_pairs(bounds['min'], bounds['max'])
+	if len(pairs_A) == 0:
+		return numpy.zeros(0, dtype=numpy.int32), 0.0
+
+	face_labels = get_island_face_labels(buffer.count_faces, islands)
+	candidates = numpy.zeros(len(islands), dtype=bool)
+	candidates[pairs_A] = True
+	candidates[pairs_B] = True
+
+	tri_loops, tri_faces = buffer.get_triangles()
+	tri_labels = face_labels[tri_faces]
+	keep = (tri_labels >= 0)
+	keep[keep] = candidates[tri_labels[keep]]
+	tri_loops = tri_loops[keep]
+	tri_faces = tri_faces[keep]
+	tri_labels = tri_labels[keep]
+
+	tris_uv = buffer.uvs[tri_loops].astype(numpy.float64)
+	A, B = get_triangle_overlap_pairs(tris_uv, tri_labels)
+
+	area = 0.0
+	for start in range(0, len(A), chunk):
+		area += get_triangles_intersection_area(tris_uv[A[start:start+chunk]], tris_uv[B[start:start+chunk]]).sum()
+
+	faces = numpy.unique(numpy.concatenate((tri_faces[A], tri_faces[B])))
+	return faces, area
+
+
+
+# Canonical signature of an island (list of BMFaces), equal for islands with identical topology:
+# face and vert count, sorted vertex valence histogram and a Weisfeiler-Lehman hash
+# of the face adjacency graph. Linear in the island size.
+def get_island_signature(faces, iterations=3):
+	verts = set()
+	for face in faces:
+		verts.update(face.verts)
+
+	valence = Counter((len(vert.link_edges), len(vert.link_faces)) for vert in verts)
+	labels = get_island_face_labels_wl(faces, iterations)
+
+	return (
+		len(faces),
+		len(verts),
+		hash(tuple(sorted(valence.items()))),
+		hash(tuple(sorted(Counter(labels.values()).items())))
+	)
+
+
+
+def get_island_area(faces):
+	return sum(face.calc_area() for face in faces)
+
+
+
+# Weisfeiler-Lehman label per face of an island: BMFace -> hash of the face size,
+# refined each iteration with the sorted labels of the neighbouring island faces
+def get_island_face_labels_wl(faces, iterations=3):
+	face_set = set(faces)
+	labels = {}
+	neighbours = {}
+	for face in faces:
+		labels[face] = len(face.loops)
+		neighbours[face] = [loop.link_loop_radial_next.face for loop in face.loops 
+			if loop.link_loop_radial_next.face != face and loop.link_loop_radial_next.face in face_set]
+
+	for i in range(iterations):
+		labels = {face: hash((labels[face], tuple(sorted(labels[other] for other in neighbours[face])))) for face in faces}
+
+	return labels
+
+
+
+# Weisfeiler-Lehman label per vertex of an island: BMVert -> label from the edge and
+# face count of the vertex within the island, refined with numpy over the island
+# edges. Mixed neighbour labels are summed so the order of the vertices doesn't matter.
+def get_island_vert_labels_wl(faces, iterations=3):
+	index = {}
+	loop_verts = []
+	edges = set()
+	for face in faces:
+		verts = [index.setdefault(loop.vert, len(index)) for loop in face.loops]
+		loop_verts.extend(verts)
+		for k in range(len(verts)):
+			edges.add((min(verts[k-1], verts[k]), max(verts[k-1], verts[k])))
+
+	count = len(index)
+	edges = numpy.array(list(edges), dtype=numpy.int64).reshape(-1, 2)
+	A = numpy.concatenate((edges[:, 0], edges[:, 1]))
+	B = numpy.concatenate((edges[:, 1], edges[:, 0]))
+
+	labels = numpy.bincount(A, minlength=count).astype(numpy.uint64) * numpy.uint64(1000003)
+	labels += numpy.bincount(numpy.array(loop_verts, dtype=numpy.int64), minlength=count).astype(numpy.uint64)
+	for i in range(iterations):
+		sums = numpy.zeros(count, dtype=numpy.uint64)
+		numpy.add.at(sums, A, get_mix_64(labels[B]))
+		labels = get_mix_64(labels * numpy.uint64(0x9E3779B97F4A7C15) + sums)
+
+	return dict(zip(index.keys(), labels.tolist()))
+
+
+
+# Splitmix64 finalizer of an uint64 array, wraps around on overflow
+def get_mix_64(x):
+	x = x ^ (x >> numpy.uint64(30))
+	x = x * numpy.uint64(0xBF58476D1CE4E5B9)
+	x = x ^ (x >> numpy.uint64(27))
+	x = x * numpy.uint64(0x94D049BB133111EB)
+	return x ^ (x >> numpy.uint64(31))
+
+
+
+# Loop to loop correspondence between two islands (sets of BMFaces) with identical
+# topology, walking both breadth first from a pair of start loops. The walk direction
+# is tracked per face (forward or reversed winding), so mirrored islands match too.
+# Returns a list of (loop_A, loop_B) pairs or None if the topology doesn't match.
+def get_loop_correspondence(start_A, start_B, forward, faces_A, faces_B):
+	pairs = []
+	face_map = {start_A.face: start_B.face}
+	faces_used = set([start_B.face])
+	vert_map = {}
+	verts_used = {}
+	queue = [(start_A, start_B, forward)]
+
+	while queue:
+		loop_A, loop_B, forward = queue.pop()
+		if len(loop_A.face.loops) != len(loop_B.face.loops):
+			return None
+
+		for k in range(len(loop_A.face.loops)):
+			if vert_map.setdefault(loop_A.vert, loop_B.vert) != loop_B.vert:
+				return None
+			if verts_used.setdefault(loop_B.vert, loop_A.vert) != loop_A.vert:
+				return None
+			pairs.append((loop_A, loop_B))
+
+			# Edge from this loop's vert to the next one, in both islands
+			next_B = loop_B.link_loop_next if forward else loop_B.link_loop_prev
+			edge_B = loop_B if forward else next_B
+			radial_A = loop_A.link_loop_radial_next
+			radial_B = edge_B.link_loop_radial_next
+			other_A = radial_A.face if radial_A.face != loop_A.face and radial_A.face in faces_A else None
+			other_B = radial_B.face if radial_B.face != loop_B.face and radial_B.face in faces_B else None
+
+			if (other_A is None) != (other_B is None):
+				return None
+
+			if other_A is not None:
+				if other_A in face_map:
+					if face_map[other_A] != other_B:
+						return None
+				else:
+					if other_B in faces_used:
+						return None
+					face_map[other_A] = other_B
+					faces_used.add(other_B)
+
+					# Start the neighbours at the same edge vertex, find their winding
+					if radial_A.vert == loop_A.vert:
+						vert_start, vert_end = loop_B.vert, next_B.vert
+					else:
+						vert_start, vert_end = next_B.vert, loop_B.vert
+					start_other_B = radial_B if radial_B.vert == vert_start else radial_B.link_loop_next
+					queue.append((radial_A, start_other_B, start_other_B.link_loop_next.vert == vert_end))
+
+			loop_A = loop_A.link_loop_next
+			loop_B = next_B
+
+	if len(face_map) != len(faces_A) or len(faces_A) != len(faces_B):
+		return None
+
+	return pairs
+
+
+
+# 2D rigid fit (Kabsch) of source onto target points (n, 2): rotation R and the two centers
+# so that (source - center_source) @ R.T + center_target matches target. With allow_mirror
+# R may be a reflection. Returns R, center_source, center_target and the mean squared error.
+def get_rigid_fit(source, target, allow_mirror=False):
+	center_source = source.mean(axis=0)
+	center_target = target.mean(axis=0)
+
+	H = (source - center_source).T.dot(target - center_target)
+	U, S, Vt = numpy.linalg.svd(H)
+	R = Vt.T.dot(U.T)
+	if numpy.linalg.det(R) < 0 and not allow_mirror:
+		Vt[1] *= -1
+		R = Vt.T.dot(U.T)
+
+	fitted = (source - center_source).dot(R.T) + center_target
+	error = ((fitted - target) ** 2).sum(axis=1).mean()
+
+	return R, center_source, center_target, error
+
+
+
+# Bucket islands (lists of BMFaces) by signature in one pass, then split each bucket
+# by 3D area: sorted by area, an island stays in the group of the previous one if
+# their area ratio is at least area_ratio. Returns (signature, run) -> island indices
+def get_islands_by_signature(islands, area_ratio=0.7):
+	buckets = defaultdict(list)
+	for i in range(len(islands)):
+		buckets[get_island_signature(islands[i])].append(i)
+	areas = [get_island_area(island) for island in islands]
+
+	groups = {}
+	for signature, indices in buckets.items():
+		indices.sort(key=lambda i: areas[i])
+		run = 0
+		for k in range(len(indices)):
+			if k > 0 and areas[indices[k - 1]] < area_ratio * areas[indices[k]]:
+				run += 1
+			groups.setdefault((signature, run), []).append(indices[k])
+	return groups
+
+
+
+# Loop index arrays for islands given as face index arrays, in island order
+def get_island_loops(buffer, islands):
+	face_labels = get_island_face_labels(buffer.count_faces, islands)
+	loop_labels = buffer.get_loop_labels(face_labels)
+
+	# Loops outside any island (-1) sort to the front
+	order = numpy.argsort(loop_labels, kind='stable').astype(numpy.int32)
+	counts = numpy.bincount(loop_labels[loop_labels >= 0], minlength=len(islands))
+	order = order[len(order) - counts.sum():]
+
+	return numpy.split(order, numpy.cumsum(counts)[:-1])
+
+
+
+# Per face island label array from a list of face index arrays
+def get_island_face_labels(count_faces, islands):
+	face_labels = numpy.full(count_faces, -1, dtype=numpy.int32)
+	for i, island in enumerate(islands):
+		face_labels[island] = i
+	return face_labels
+
 
 
 def getSelectionIslands():
@@ -147,49 +752,309 @@ def getSelectionIslands():
 	bm = bmesh.from_edit_mesh(bpy.context.active_object.data)
 	uvLayer = bm.loops.layers.uv.verify()
 
-	#Reference A: https://github.com/nutti/Magic-UV/issues/41
-	#Reference B: https://github.com/c30ra/uv-align-distribute/blob/v2.2/make_island.py
+	islands_indices = get_selection_islands_indices(bm, uvLayer)
+
+	# Resolve face indices into BMFaces for callers working on bmesh faces
+	bm.faces.ensure_lookup_table()
+	islands = [[bm.faces[index] for index in island] for island in islands_indices]
 
-	#Extend selection
-	if bpy.context.scene.tool_settings.use_uv_select_sync == False:
-		bpy.ops.uv.select_linked(extend=False)
- 
-	#Collect selected UV faces
-	faces_selected = [];
-	for face in bm.faces:
-		if face.select and face.loops[0][uvLayer].select:
-			faces_selected.append(face)
-		
-	#Collect UV islands
-	# faces_parsed = []
-	faces_unparsed = faces_selected.copy()
-	islands = []
-
-	for face in faces_selected:
-		if face in faces_unparsed:
-
-			#Select single face
-			bpy.ops.uv.select_all(action='DESELECT')
-			face.loops[0][uvLayer].select = True;
-			bpy.ops.uv.select_linked(extend=False)#Extend selection
-			
-			#Collect faces
-			islandFaces = [face];
-			for faceAll in faces_unparsed:
-				if faceAll != face and faceAll.select and faceAll.loops[0][uvLayer].select:
-					islandFaces.append(faceAll)
-			
-			for faceAll in islandFaces:
-				faces_unparsed.remove(faceAll)
-
-			#Assign Faces to island
-			islands.append(islandFaces)
-	
-	#Restore selection 
-	# for face in faces_selected:
-	# 	for loop in face.loops:
-	# 		loop[uvLayer].select = True
-
-	
 	print("Islands: {}x, {:.4f} seconds".format(len(islands), time.time() - time_A))
 	return islands
+
+
+
+# Return islands (face index arrays) that contain at least one selected UV face.
+# Selected faces are extended to their full island like uv.select_linked does,
+# but without calling any operators or changing the selection
+def get_selection_islands_indices(bm, uvLayer):
+	is_sync = bpy.context.scene.tool_settings.use_uv_select_sync
+
+	# Outside of sync mode the UV editor only shows selected mesh faces
+	faces_visible = [face for face in bm.faces if face.select and not face.hide]
+	if is_sync:
+		faces_seed = faces_visible
+	else:
+		faces_seed = [face for face in faces_visible if face.loops[0][uvLayer].select]
+
+	if len(faces_seed) == 0:
+		return []
+
+	labels = get_island_labels_cached(bpy.context.active_object, bm, uvLayer, faces_visible)
+	labels_seed = set(labels[face.index] for face in faces_seed)
+
+	return [island for island in split_island_labels(labels) if labels[island[0]] in labels_seed]
+
+
+
+# Label each face with the index of its UV island, -1 for faces not in 'faces'.
+# Two faces are connected when they share an edge with matching UVs on both ends.
+# Union-find over face indices, one pass over the loops without any operators.
+def get_island_labels(bm, uvLayer, faces=None, threshold=0.00001):
+	if faces is None:
+		faces = bm.faces
+
+	bm.faces.index_update()
+	count = len(bm.faces)
+
+	included = bytearray(count)
+	for face in faces:
+		included[face.index] = 1
+
+	parent = list(range(count))
+
+	def find(index):
+		root = index
+		while parent[root] != root:
+			root = parent[root]
+		# Path compression
+		while parent[index] != root:
+			parent[index], index = root, parent[index]
+		return root
+
+	threshold_sq = threshold * threshold
+
+	for face in faces:
+		index_A = face.index
+		for loop in face.loops:
+			loop_other = loop.link_loop_radial_next
+			if loop_other == loop:
+				continue	# Boundary edge
+
+			index_B = loop_other.face.index
+			if not included[index_B]:
+				continue
+
+			root_A = find(index_A)
+			root_B = find(index_B)
+			if root_A == root_B:
+				continue
+
+			# Match UV's of the shared edge in the winding of the other face
+			if loop_other.vert == loop.vert:
+				uv_B_start = loop_other[uvLayer].uv
+				uv_B_end = loop_other.link_loop_next[uvLayer].uv
+			else:
+				uv_B_start = loop_other.link_loop_next[uvLayer].uv
+				uv_B_end = loop_other[uvLayer].uv
+
+			if (loop[uvLayer].uv - uv_B_start).length_squared > threshold_sq:
+				continue
+			if (loop.link_loop_next[uvLayer].uv - uv_B_end).length_squared > threshold_sq:
+				continue
+
+			parent[root_B] = root_A
+
+	# Compact island labels in order of their lowest face index
+	labels = numpy.full(count, -1, dtype=numpy.int32)
+	roots = {}
+	for index in range(count):
+		if included[index]:
+			labels[index] = roots.setdefault(find(index), len(roots))
+
+	return labels
+
+
+
+# Island labels from the cache if nothing changed since the last call, otherwise
+# rebuild them and store them as the most recently used entry. The fingerprint
+# holds the element counts, the faces asked for, a checksum of the UV's and loop
+# vertices and the edit counter that island_cache_invalidate() bumps. The checksum
+# catches UV edits of operators that don't invalidate, like unwrap or stitch.
+def get_island_labels_cached(obj, bm, uvLayer, faces=None):
+	bm.faces.index_update()
+	faces_key = None
+	if faces is not None:
+		faces_key = hash(tuple(face.index for face in faces))
+
+	key = (obj.name, uvLayer.name)
+	fingerprint = (len(bm.verts), len(bm.edges), len(bm.faces), faces_key, get_uv_checksum(obj, uvLayer.name), settings.island_cache_counter)
+
+	entry = settings.island_cache.get(key)
+	if entry and entry[0] == fingerprint:
+		settings.island_cache.move_to_end(key)
+		return entry[1]
+
+	labels = get_island_labels(bm, uvLayer, faces)
+
+	settings.island_cache[key] = (fingerprint, labels)
+	settings.island_cache.move_to_end(key)
+	while len(settings.island_cache) > settings.island_cache_size:
+		settings.island_cache.popitem(last=False)
+
+	return labels
+
+
+
+# Checksum of the UV's and loop vertices of a UV layer, read with foreach_get
+# from the mesh after syncing the edit-mesh
+def get_uv_checksum(obj, uv_layer_name):
+	mesh = obj.data
+	if obj.mode == 'EDIT':
+		obj.update_from_editmode()
+
+	count = len(mesh.loops)
+	uvs = utilities_buffer.foreach_get(mesh.uv_layers[uv_layer_name].data, 'uv', count, 2)
+	loop_verts = utilities_buffer.foreach_get(mesh.loops, 'vertex_index', count, 1, numpy.int32)
+	return hash((uvs.tobytes(), loop_verts.tobytes()))
+
+
+
+# Drop cached islands of an object, or of all objects if none given.
+# Operators that modify UV's call this so the next island lookup rebuilds.
+def island_cache_invalidate(obj=None):
+	settings.island_cache_counter += 1
+	if obj is None:
+		settings.island_cache.clear()
+		return
+
+	for key in [key for key in settings.island_cache if key[0] == obj.name]:
+		del settings.island_cache[key]
+
+
+
+# Split a face label array into one sorted face index array per island
+def split_island_labels(labels):
+	indices = numpy.flatnonzero(labels >= 0)
+	if len(indices) == 0:
+		return []
+
+	order = numpy.argsort(labels[indices], kind='stable')
+	indices = indices[order]
+	labels_sorted = labels[indices]
+	splits = numpy.flatnonzero(numpy.diff(labels_sorted)) + 1
+
+	return numpy.split(indices.astype(numpy.int32), splits)
+
+
+
+# Rotation (radians) that gives the points the smallest bounding box, plus the
+# resulting width and height. The optimal box has a side on the convex hull
+# (rotating calipers), so only the hull edge directions are tested, all at once.
+# mode 'AREA' minimizes width * height, 'WIDTH' minimizes the shorter side.
+def get_minimal_bounds_angle(points, mode='AREA'):
+	points = numpy.asarray(points, dtype=numpy.float64)
+	if len(points) < 2:
+		return 0.0, 0.0, 0.0
+
+	hull = points[convex_hull_2d(points.tolist())]
+	edges = numpy.roll(hull, -1, axis=0) - hull
+	edges = edges[(edges * edges).sum(axis=1) > 0]
+	if len(edges) == 0:
+		return 0.0, 0.0, 0.0
+
+	# Boxes repeat every 90 degrees
+	angles = numpy.unique(numpy.mod(numpy.arctan2(edges[:, 1], edges[:, 0]), pi / 2))
+	cos = numpy.cos(angles)
+	sin = numpy.sin(angles)
+
+	# Hull rotated by -angle, one column per candidate angle
+	x = numpy.outer(hull[:, 0], cos) + numpy.outer(hull[:, 1], sin)
+	y = numpy.outer(hull[:, 1], cos) - numpy.outer(hull[:, 0], sin)
+	width = x.max(axis=0) - x.min(axis=0)
+	height = y.max(axis=0) - y.min(axis=0)
+
+	if mode == 'WIDTH':
+		score = numpy.minimum(width, height)
+	else:
+		score = width * height
+
+	best = numpy.argmin(score)
+	return -angles[best], width[best], height[best]
+
+
+
+# Rotate the UV's of the given loops in place around center, by default their bounding box center
+def rotate_uvs(uvs, loops, angle, center=None):
+	points = uvs[loops].astype(numpy.float64)
+	if center is None:
+		center = (points.min(axis=0) + points.max(axis=0)) / 2
+	delta = points - center
+
+	cos = math.cos(angle)
+	sin = math.sin(angle)
+	rotated = numpy.empty_like(delta)
+	rotated[:, 0] = delta[:, 0] * cos - delta[:, 1] * sin
+	rotated[:, 1] = delta[:, 0] * sin + delta[:, 1] * cos
+
+	uvs[loops] = rotated + center
+
+
+
+# Rotate an island (loop indices into uvs) to its minimal bounds, landscape oriented
+def align_island_minimal_bounds(uvs, loops, mode='AREA'):
+	angle, width, height = get_minimal_bounds_angle(uvs[loops], mode)
+	if width < height:
+		angle += pi / 2
+
+	if angle != 0:
+		rotate_uvs(uvs, loops, angle)
+
+
+
+# Cluster UV's (n, 2) that lie within tolerance of each other, transitively, with
+# a uniform grid hash of cell size tolerance: only points in the same or a
+# neighbouring cell are compared, which keeps it about linear in n. With
+# loop_verts only loops of the same mesh vertex merge, giving the unique UV vertices.
+# Returns (n) int32 cluster ids, consecutive from 0, and the number of clusters.
+def get_uv_clusters(uvs, tolerance=0.001, loop_verts=None):
+	uvs = numpy.asarray(uvs, dtype=numpy.float32).reshape(-1, 2)
+	if len(uvs) == 0:
+		return numpy.zeros(0, dtype=numpy.int32), 0
+	if loop_verts is None:
+		loop_verts = numpy.zeros(len(uvs), dtype=numpy.int64)
+
+	# One key per vertex and cell, padded so neighbour cells never wrap into the next row
+	cells = numpy.floor(uvs / tolerance).astype(numpy.int64)
+	cells -= cells.min(axis=0) - 1
+	size_x = int(cells[:, 0].max()) + 2
+	size_y = int(cells[:, 1].max()) + 2
+	keys = (numpy.asarray(loop_verts, dtype=numpy.int64) * size_x + cells[:, 0]) * size_y + cells[:, 1]
+
+	# Merge exact duplicates first, the loops of a UV vertex mostly share one value.
+	# The float bits of both coordinates make one exact integer per UV position.
+	bits = uvs.view(numpy.uint32).astype(numpy.uint64)
+	positions = (bits[:, 0] << numpy.uint64(32)) | bits[:, 1]
+	order = numpy.lexsort((positions, keys))
+	is_new = numpy.ones(len(uvs), dtype=bool)
+	is_new[1:] = (keys[order][1:] != keys[order][:-1]) | (positions[order][1:] != positions[order][:-1])
+
+	inverse = numpy.empty(len(uvs), dtype=numpy.int64)
+	inverse[order] = numpy.cumsum(is_new) - 1
+	points = uvs[order[is_new]].astype(numpy.float64)
+	keys = keys[order[is_new]]
+	count = len(points)
+
+	# Candidate pairs in the own cell and half of the neighbour cells
+	pairs_A = []
+	pairs_B = []
+	for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+		target = keys + dx * size_y + dy
+		start = numpy.searchsorted(keys, target, side='left')
+		counts = numpy.searchsorted(keys, target, side='right') - start
+
+		A = numpy.repeat(numpy.arange(count), counts)
+		B = numpy.repeat(start - (numpy.cumsum(counts) - counts), counts) + numpy.arange(counts.sum())
+		if dx == 0 and dy == 0:
+			A, B = A[A < B], B[A < B]
+
+		close = ((points[A] - points[B]) ** 2).sum(axis=1) <= tolerance * tolerance
+		pairs_A.append(A[close])
+		pairs_B.append(B[close])
+
+	A = numpy.concatenate(pairs_A)
+	B = numpy.concatenate(pairs_B)
+
+	# Connected components: propagate the lowest label over the pairs with pointer jumping
+	labels = numpy.arange(count)
+	while len(A) > 0:
+		low = numpy.minimum(labels[A], labels[B])
+		if (labels[A] == low).all() and (labels[B] == low).all():
+			break
+		numpy.minimum.at(labels, A, low)
+		numpy.minimum.at(labels, B, low)
+		labels = labels[labels]
+
+	# Each component is labeled by its lowest point, number the roots in order
+	roots = labels == numpy.arange(count)
+	ids = (numpy.cumsum(roots) - 1).astype(numpy.int32)
+	return ids[labels][inverse], int(roots.sum())